@@ -0,0 +1,221 @@
+import numpy as np
+
+from game import AbstractDinoGame
+
+"""
+ - batch:
+ Steps many dino games at once with NumPy, for evaluating a population of perceptron weights.
+    - Every game is a row in a set of struct-of-arrays (dino y/dy/on_ground, obstacle x/y/w/h, speed, spawn timers)
+    - Each obstacle type gets one slot per game, the same as AbstractDinoGame with max_copies=1 (the default)
+    - Physics, spawning and AABB collisions follow AbstractDinoGame.tick frame for frame,
+      with the same float positions as physics.Box
+"""
+
+
+class BatchDinoGame:
+    """
+    N independent dino games stepped together with vectorized physics.
+    """
+
+    def __init__(self, n: int, display_rect: tuple, image_sizes: dict, frame_delay: int, scale: float, seed=None):
+        """
+        Takes the same settings as AbstractDinoGame, plus the number of games and a seed.
+
+        :param n: number of games to run side by side
+        :param seed: seed for the spawn rolls, None for a random course
+        """
+        # borrow the constants from a scalar game so both always agree
+        template = AbstractDinoGame(None, display_rect, image_sizes, frame_delay, scale)
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.width = template.game_display.w
+        self.gnd = template.gnd
+
+        # kinematics constants
+        self.init_velocity = template.init_velocity
+        self.dino_jump_velocity = template.dino_jump_velocity
+        self.gravity = template.gravity
+        self.dino_accel_rate = template.dino_accel_rate
+        self.speed_increase_tick = template.speed_increase_tick
+        self.spawn_const = template.spawn_const
+
+        # dino (all games share the same x position and size)
+        self.dino_x = float(template.dino.hitbox.left)
+        self.dino_w = float(template.dino.hitbox.w)
+        self.dino_h = float(template.dino.hitbox.h)
+
+        # obstacle types, in the same order as AbstractDinoGame.obstacles
+        self.names = [obst.name for obst in template.obstacles]
+        self.obst_w = np.array([obst.hitbox.w for obst in template.obstacles], dtype=np.float64)
+        self.obst_h = np.array([obst.hitbox.h for obst in template.obstacles], dtype=np.float64)
+        self.base_speed = np.array([obst.base_speed[0] for obst in template.obstacles], dtype=np.float64)
+        self.is_ptero = np.array([name == 'ptero' for name in self.names])
+        self.min_wait = np.where(self.is_ptero, self.spawn_const * 1.5, self.spawn_const)
+        self.k = len(self.names)
+
+        # per game state
+        self.playing = np.zeros(n, dtype=bool)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.frames = np.zeros(n, dtype=np.int64)
+        self.spawn_wait = np.zeros(n, dtype=np.int64)
+        self.spawn_roll = np.zeros(n, dtype=np.int64)
+        self.game_speed = np.zeros(n, dtype=np.float64)
+        self.dino_y = np.zeros(n, dtype=np.float64)
+        self.dino_dy = np.zeros(n, dtype=np.float64)
+        self.on_ground = np.zeros(n, dtype=bool)
+
+        # per game, per obstacle type state
+        self.obst_active = np.zeros((n, self.k), dtype=bool)
+        self.obst_x = np.zeros((n, self.k), dtype=np.float64)
+        self.obst_y = np.zeros((n, self.k), dtype=np.float64)
+        self.obst_dx = np.zeros((n, self.k), dtype=np.float64)
+        self.obst_order = np.zeros((n, self.k), dtype=np.int64)
+        self.spawn_count = 0
+
+        self._rows = np.arange(n)
+        self.reset()
+
+    def reset(self, mask=None):
+        """
+        Starts a new game in every row selected by the mask (all rows by default).
+
+        :param mask: boolean array of games to restart
+        """
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+        self.playing[mask] = True
+        self.score[mask] = 0
+        self.frames[mask] = 0
+        self.spawn_wait[mask] = 0
+        self.spawn_roll[mask] = self.rollSpawnGaps(np.count_nonzero(mask))
+        self.game_speed[mask] = self.init_velocity
+        self.dino_y[mask] = self.gnd - self.dino_h
+        self.dino_dy[mask] = 0.0
+        self.on_ground[mask] = True
+        self.obst_active[mask] = False
+        self.obst_dx[mask] = 0.0
+
+    def tick(self, jump):
+        """
+        Runs one frame of every game that is still playing.
+
+        :param jump: boolean array, the jump control of each game
+        """
+        # a copy: a game that dies this frame still spawns and counts the frame, like the scalar game
+        p = self.playing.copy()
+
+        # Increase the speed to the max
+        speed_up = p & (self.frames % self.speed_increase_tick == 0) & (self.game_speed < 40)
+        self.game_speed[speed_up] += self.dino_accel_rate
+
+        # control the dino
+        jumping = p & jump & self.on_ground
+        self.dino_dy[jumping] = self.dino_jump_velocity
+
+        # dino physics
+        self.dino_y[p] += self.dino_dy[p]
+        take_off = p & self.on_ground & (self.dino_dy < 0)
+        falling = p & ~take_off
+        self.on_ground[take_off] = False
+        self.dino_dy[falling] += self.gravity
+        landed = falling & (self.dino_y + self.dino_h >= self.gnd)
+        self.dino_y[landed] = self.gnd - self.dino_h
+        self.dino_dy[landed] = 0.0
+        self.on_ground[landed] = True
+
+        # collisions, against the obstacles before they move this frame
+        hit = (self.obst_active
+               & (self.dino_x < self.obst_x + self.obst_w) & (self.obst_x < self.dino_x + self.dino_w)
+               & (self.dino_y[:, None] < self.obst_y + self.obst_h) & (self.obst_y < (self.dino_y + self.dino_h)[:, None]))
+        dead = p & hit.any(axis=1)
+
+        # move the obstacles and retire the ones that left the screen
+        moving = self.obst_active & p[:, None]
+        self.obst_x += np.where(moving, self.obst_dx, 0.0)
+        self.obst_dx = np.where(moving, self.base_speed - self.game_speed[:, None], self.obst_dx)
+        gone = moving & (self.obst_x + self.obst_w < 0)
+        self.score += gone.sum(axis=1)
+        self.obst_active &= ~gone
+        self.obst_dx = np.where(gone, self.base_speed, self.obst_dx)
+
+        self.playing &= ~dead
+        self.spawnObstacles(p)
+
+        self.spawn_wait[p] += 1
+        self.frames[p] += 1
+
+    def spawnObstacles(self, mask):
+        """
+        Vectorized spawnObstacle: counts down each game's spawn roll, then picks a random obstacle type if it hits.
+
+        :param mask: the games that ticked this frame
+        """
+        self.spawn_roll[mask] -= 1
+        roll = mask & (self.spawn_roll <= 0)
+        self.spawn_roll[roll] = self.rollSpawnGaps(np.count_nonzero(roll))
+        index = self.rng.integers(0, self.k, size=self.n)
+        level = self.rng.integers(0, 3, size=self.n)
+
+        spawn = (mask & roll
+                 & (self.spawn_wait > self.min_wait[index])
+                 & ~self.obst_active[self._rows, index])
+        rows = self._rows[spawn]
+        cols = index[spawn]
+        bottom = np.where(self.is_ptero[cols], self.gnd - self.dino_h * level[spawn], self.gnd)
+
+        self.spawn_wait[spawn] = 0
+        self.obst_active[rows, cols] = True
+        self.obst_x[rows, cols] = self.width
+        self.obst_y[rows, cols] = bottom - self.obst_h[cols]
+        self.obst_order[rows, cols] = self.spawn_count + np.arange(len(rows))
+        self.spawn_count += len(rows)
+
+    def rollSpawnGaps(self, n):
+        """
+        Vectorized AbstractDinoGame.rollSpawnGap: geometric gaps until the next spawn roll hits.
+
+        :param n: number of gaps to draw
+        :return: int array of gaps, each at least 1
+        """
+        return 1 + (np.log1p(-self.rng.random(n)) / np.log1p(-1 / self.spawn_const)).astype(np.int64)
+
+    def features(self):
+        """
+        Vectorized build_input_vector for the first obstacle in front of each dino.
+
+        :return: (x, found) where x is an (n, 6) array and found marks the games with an obstacle ahead
+        """
+        right = self.obst_x + self.obst_w
+        ahead = self.obst_active & (right - self.dino_x > 0)
+        order = np.where(ahead, self.obst_order, np.iinfo(np.int64).max)
+        first = order.argmin(axis=1)
+        found = ahead[self._rows, first]
+
+        height = self.gnd - (self.obst_y[self._rows, first] + self.obst_h[first])
+        x = np.empty((self.n, 6), dtype=np.float64)
+        x[:, 0] = right[self._rows, first] - self.dino_x
+        x[:, 1] = height
+        x[:, 2] = height ** 2
+        x[:, 3] = self.obst_w[first]
+        x[:, 4] = self.obst_h[first]
+        x[:, 5] = self.game_speed - self.base_speed[first]
+        return x, found
+
+    def evaluate(self, weights, max_frames=100000):
+        """
+        Plays one game per weight vector with the perceptron's decision rule (jump when w . x > 0),
+        without any learning, until every dino has died or max_frames have passed.
+
+        :param weights: (n, 6) array of perceptron weights
+        :param max_frames: frame limit for dinos that never die
+        :return: the score of each game
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        self.reset()
+        for _ in range(max_frames):
+            if not self.playing.any():
+                break
+            x, found = self.features()
+            jump = found & (np.einsum('ij,ij->i', weights, x) > 0)
+            self.tick(jump)
+        return self.score.copy()
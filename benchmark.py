@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pygame as pg
+
+from perceptron import Perceptron, build_input_vector
+from graphics import GFX, StatusPanel, checkSprites
+from game import AbstractDinoGame
+from headless import FRAME_DELAY, SCALE_FACTOR, WINDOW_SIZE
+from features import RICH, FeaturePipeline
+
+"""
+ - benchmark:
+ Times the hot paths of the game one at a time and end to end.
+    - Rendering runs on the dummy video driver, so no window is needed
+    - Every benchmark reports calls per second (fps), per-call latency percentiles
+      and the bytes allocated per call (the transient peak, and what is still held after the call)
+    - Results can be saved as json, and a later run can be compared against them
+      to fail on a regression
+    - Before timing, the sprites GFX draws (from the atlas cache and built cold) are checked
+      to leave the same pixels as the sprite sheet's, and the run fails if they don't
+"""
+
+
+class World:
+    """
+    A game mid-run with every part the benchmarks need: graphics, perceptron and game.
+    """
+
+    def __init__(self, seed=0, warmup=3000):
+        """
+        :param seed: game seed, so every run sees the same courses
+        :param warmup: frames to play first, so the perceptron has learned something and obstacles are on screen
+        """
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        pg.display.init()
+        pg.font.init()
+        self.graphics = GFX(WINDOW_SIZE, SCALE_FACTOR, FRAME_DELAY)
+        self.percep = Perceptron([('play', -1), ('jump', 0)])
+        self.game = AbstractDinoGame(self.percep, (0, 0) + WINDOW_SIZE, self.graphics.getSizes(),
+                                     FRAME_DELAY, SCALE_FACTOR, seed)
+        self.graphics.setGround(self.game.gnd)
+        self.status = StatusPanel(self.graphics.foreground, self.graphics.background)
+        self.state = self.game.getGameState()
+        self.state['freeze'] = True
+        self.percep.w[:] = [-0.1, 0.0, -1.0, 0.1, 0.2, 0.07]
+        for _ in range(warmup):
+            self.frame()
+
+    def frame(self):
+        self.percep.tick(self.state)
+        self.game.tick()
+
+    def drawStatus(self):
+        self.status.update(self.percep.w, self.percep.activation, self.percep.deaths, self.state)
+        self.graphics.disp.blit(self.status.render(), (0, 0))
+
+    def draw(self):
+        self.graphics.draw(self.state, self.game.dino, self.game.obstacles_in_play)
+
+    def drawDirty(self):
+        self.graphics.drawDirty(self.state, self.game.dino, self.game.obstacles_in_play)
+
+
+def timeCalls(fn, n, between=None):
+    """
+    Times n calls of fn, one by one.
+
+    :param fn: the function to time
+    :param n: number of calls
+    :param between: optional untimed function to run before every call
+    :return: array of call times in nanoseconds
+    """
+    times = np.empty(n, dtype=np.int64)
+    clock = time.perf_counter_ns
+    for i in range(n):
+        if between is not None:
+            between()
+        start = clock()
+        fn()
+        times[i] = clock() - start
+    return times
+
+
+def measureAllocations(fn, n, between=None):
+    """
+    Measures the memory fn allocates per call with tracemalloc.
+
+    :return: (mean transient peak bytes, mean bytes still allocated after the call)
+    """
+    peak = 0
+    held = 0
+    tracemalloc.start()
+    for _ in range(n):
+        if between is not None:
+            between()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        fn()
+        current, top = tracemalloc.get_traced_memory()
+        peak += top - before
+        held += current - before
+    tracemalloc.stop()
+    return peak / n, held / n
+
+
+def benchmarks(world):
+    """
+    The benchmarks, as name: (timed function, untimed function to run between calls).
+    """
+    dino = world.game.initDino()
+    obst = world.game.obstacles[0]
+    x = np.empty(6, dtype=np.float32)
+    snap = world.game.snapshot()
+    baseline = FeaturePipeline()
+    rich = FeaturePipeline(RICH, k=3)
+    return {
+        'game.tick': (world.game.tick, lambda: world.percep.tick(world.state)),
+        'game.snapshot': (world.game.snapshot, world.frame),
+        'game.restore': (lambda: world.game.restore(snap), None),
+        'dino.update': (lambda: dino.update(world.game.obstacles_in_play), world.frame),
+        'gfx.animate': (lambda: world.graphics.animate(world.state), world.frame),
+        'gfx.draw': (world.draw, world.frame),
+        'gfx.draw.dirty': (world.drawDirty, world.frame),
+        'gfx.status': (world.drawStatus, world.frame),
+        'build_input_vector': (lambda: build_input_vector(obst, world.state, x), world.frame),
+        'features.baseline': (lambda: baseline.compute(world.state), world.frame),
+        'features.rich.k3': (lambda: rich.compute(world.state), world.frame),
+        'perceptron.update': (lambda: world.percep.tick(world.state), world.game.tick),
+        'frame.headless': (world.frame, None),
+        'frame.rendered': (lambda: (world.frame(), world.draw()), None)
+    }
+
+
+def startupBenchmarks():
+    """
+    Graphics start-up, from the atlas cache and from the sprite sheet, as name: (timed function, None).
+    These replace the display, so they run after every other benchmark.
+    """
+    return {
+        'gfx.startup': (lambda: GFX(WINDOW_SIZE, SCALE_FACTOR, FRAME_DELAY), None),
+        'gfx.startup.cold': (lambda: GFX(WINDOW_SIZE, SCALE_FACTOR, FRAME_DELAY, atlas_cache=False), None)
+    }
+
+
+def measure(fn, between, calls, alloc_calls):
+    """
+    Runs one benchmark.
+
+    :return: dict of results
+    """
+    times = timeCalls(fn, calls, between)
+    peak, held = measureAllocations(fn, alloc_calls, between)
+    return {
+        'calls': calls,
+        'fps': calls / (times.sum() / 1e9),
+        'p50_us': float(np.percentile(times, 50)) / 1000,
+        'p95_us': float(np.percentile(times, 95)) / 1000,
+        'p99_us': float(np.percentile(times, 99)) / 1000,
+        'alloc_bytes_per_call': peak,
+        'held_bytes_per_call': held
+    }
+
+
+def run(calls=20000, alloc_calls=2000, only=None, startup_calls=20):
+    """
+    Runs every benchmark.
+
+    :param calls: timed calls per benchmark
+    :param alloc_calls: calls per benchmark for the allocation pass
+    :param only: optional list of benchmark names to run
+    :param startup_calls: timed calls for the (much slower) start-up benchmarks
+    :return: dict of benchmark name to results
+    """
+    world = World()
+    results = {}
+    for name, (fn, between) in benchmarks(world).items():
+        if not only or name in only:
+            results[name] = measure(fn, between, calls, alloc_calls)
+    for name, (fn, between) in startupBenchmarks().items():
+        if not only or name in only:
+            results[name] = measure(fn, between, startup_calls, max(1, startup_calls // 10))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Finds the benchmarks that got slower than the baseline allows.
+
+    :param results: results of this run
+    :param baseline: results of an earlier run
+    :param tolerance: allowed fractional drop in fps
+    :return: list of (name, baseline fps, new fps) for every regression
+    """
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result['fps'] < baseline[name]['fps'] * (1 - tolerance):
+            regressions.append((name, baseline[name]['fps'], result['fps']))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the game, rendering and perceptron hot paths.')
+    parser.add_argument('--calls', type=int, default=20000, help='timed calls per benchmark')
+    parser.add_argument('--only', nargs='*', help='names of the benchmarks to run')
+    parser.add_argument('--save', help='json file to write the results to')
+    parser.add_argument('--compare', help='json file of earlier results to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed fractional drop in fps')
+    args = parser.parse_args()
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pg.display.init()
+    mismatched = []
+    for atlas_cache in (True, False):
+        graphics = GFX(WINDOW_SIZE, SCALE_FACTOR, FRAME_DELAY, atlas_cache=atlas_cache)
+        mismatched += checkSprites(graphics.images, SCALE_FACTOR, graphics.background)
+    for name in mismatched:
+        print('SPRITE MISMATCH %s: draws differently from the sprite sheet' % name)
+    if mismatched:
+        sys.exit(1)
+
+    results = run(args.calls, max(1, args.calls // 10), args.only)
+    print('%-20s %12s %9s %9s %9s %12s %12s' % ('benchmark', 'fps', 'p50 us', 'p95 us', 'p99 us',
+                                               'alloc B', 'held B'))
+    for name, r in results.items():
+        print('%-20s %12.0f %9.2f %9.2f %9.2f %12.0f %12.1f' % (name, r['fps'], r['p50_us'], r['p95_us'],
+                                                              r['p99_us'], r['alloc_bytes_per_call'],
+                                                              r['held_bytes_per_call']))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print('REGRESSION %s: %.0f fps -> %.0f fps' % (name, before, after))
+        if regressions:
+            sys.exit(1)
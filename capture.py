@@ -0,0 +1,198 @@
+import json
+import os
+import queue
+import threading
+from collections import deque
+
+import numpy as np
+import pygame as pg
+
+from telemetry import TELEMETRY
+
+"""
+ - capture:
+ Records what GFX draws, without slowing down the main loop.
+    - Every Nth rendered frame is copied out of the display surface (through a surfarray view, no bytes object)
+      into one of a few preallocated buffers, as 32 bit pixels, one memcpy per row. That copy is all the main loop pays for
+    - A background thread converts the buffers to RGB, writes them out and hands them back: to a raw RGB24 frame file,
+      which loadFrames() memory-maps as an (n, height, width, 3) array and ffmpeg reads as rawvideo,
+      or to a PNG sequence
+    - Before-death mode keeps only the last few seconds of frames in the ring, and writes them
+      as one clip when the dino dies
+    - When the writer falls behind and no buffer is free, the frame is dropped (and counted), never waited for
+"""
+
+
+class FrameCapture:
+    """
+    Copies rendered frames into a ring of buffers, and writes them out on a background thread.
+    """
+
+    def __init__(self, directory, size, every=1, fmt='raw', before_death=None, fps=60, buffers=32):
+        """
+        :param directory: where the frame files go
+        :param size: (width, height) of the display
+        :param every: capture every Nth rendered frame
+        :param fmt: 'raw' for one RGB24 frame file per recording, 'png' for a PNG per frame
+        :param before_death: only keep this many seconds before each death, None to capture everything
+        :param fps: rendered frames per second, to turn before_death into a number of frames
+        :param buffers: buffers the writer can fall behind by, on top of the before-death frames
+        :raises ValueError: for an unknown format
+        """
+        if fmt not in ('raw', 'png'):
+            raise ValueError('unknown capture format %r, expected raw or png' % fmt)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.width, self.height = size
+        self.every = every
+        self.fmt = fmt
+        self.fps = fps
+        self.keep = None
+        if before_death is not None:
+            self.keep = max(1, int(round(before_death * fps / every)))
+            buffers += self.keep
+        self.ring = np.zeros((buffers, self.height, self.width), dtype=np.uint32)
+        self.rgb = np.zeros((self.height, self.width, 3), dtype=np.uint8)  # the writer's conversion buffer
+        self.shifts = None  # of the red, green and blue bytes in the display's pixels
+        self.free = deque(range(buffers))  # slots the main loop can copy into
+        self.recent = deque()  # before-death mode: slots of the last keep frames, oldest first
+        self.jobs = queue.Queue()  # (clip name, [(slot, frame number)]), None to stop
+        self.rendered = 0
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.clips = 0
+        self.playing = False
+        self.files = {}  # clip name -> open raw file
+        self.thread = threading.Thread(target=self.writer, name='capture', daemon=True)
+        self.thread.start()
+
+    def capture(self, surface, game_state):
+        """
+        Call once per rendered frame, after drawing.
+
+        :param surface: the display surface
+        :param game_state: the game state, to tell when the dino dies
+        """
+        playing = game_state['playing']
+        died = self.playing and not playing
+        self.playing = playing
+        self.rendered += 1
+        if self.keep is not None and not playing and not died:
+            # nothing happens between a death and the next game
+            return
+        if self.rendered % self.every == 0:
+            slot = self.slot()
+            if slot is None:
+                self.dropped += 1
+            else:
+                if self.shifts is None:
+                    self.shifts = surface.get_shifts()[:3]
+                # pixels2d is an (x, y) view of the surface, so its transpose has the surface's rows
+                pixels = pg.surfarray.pixels2d(surface)
+                np.copyto(self.ring[slot], pixels.T)
+                del pixels
+                self.captured += 1
+                if self.keep is None:
+                    self.jobs.put(('capture', [(slot, self.rendered)]))
+                else:
+                    self.recent.append((slot, self.rendered))
+        if died and self.keep is not None and self.recent:
+            self.clips += 1
+            self.jobs.put(('death_%04d' % self.clips, list(self.recent)))
+            self.recent.clear()
+
+    def slot(self):
+        """
+        :return: a buffer to copy the next frame into, None when the writer holds all of them
+        """
+        if self.keep is not None and len(self.recent) >= self.keep:
+            # reuse the oldest frame, it is out of the window now
+            return self.recent.popleft()[0]
+        if self.free:
+            return self.free.popleft()
+        return None
+
+    def writer(self):
+        """
+        The writer thread: writes each job's frames, then gives their buffers back.
+        """
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            name, frames = job
+            for slot, frame in frames:
+                self.write(name, slot, frame)
+                self.free.append(slot)
+            if self.keep is not None:
+                self.closeClip(name)
+
+    def write(self, name, slot, frame):
+        """
+        Writes the frame in a buffer.
+
+        :param name: the clip the frame belongs to
+        :param slot: the buffer
+        :param frame: the rendered frame number, for PNG file names
+        """
+        pixels = self.ring[slot]
+        for channel, shift in enumerate(self.shifts):
+            np.right_shift(pixels, shift, out=self.rgb[..., channel], casting='unsafe')
+        if self.fmt == 'png':
+            directory = os.path.join(self.directory, name)
+            os.makedirs(directory, exist_ok=True)
+            image = pg.image.frombuffer(self.rgb, (self.width, self.height), 'RGB')
+            pg.image.save(image, os.path.join(directory, 'frame_%07d.png' % frame))
+        else:
+            file = self.files.get(name)
+            if file is None:
+                file = self.files[name] = open(os.path.join(self.directory, name + '.rgb'), 'wb')
+            file.write(self.rgb.data)
+        self.written += 1
+
+    def closeClip(self, name):
+        """
+        Closes a clip's raw file, and writes its shape next to it for loadFrames.
+        """
+        file = self.files.pop(name, None)
+        if file is None:
+            return
+        frames = file.tell() // self.rgb.nbytes
+        file.close()
+        with open(os.path.join(self.directory, name + '.json'), 'w') as f:
+            json.dump({'width': self.width, 'height': self.height, 'frames': frames,
+                       'fps': self.fps / self.every}, f)
+
+    def close(self):
+        """
+        Writes what is queued, stops the writer thread and logs the report.
+        Frames kept for a death that didn't happen are dropped.
+        """
+        if self.thread is None:
+            return
+        self.jobs.put(None)
+        self.thread.join()
+        self.thread = None
+        for name in list(self.files):
+            self.closeClip(name)
+        TELEMETRY.info('capture', self.report())
+
+    def report(self):
+        """
+        :return: a summary line of the frames captured, written and dropped
+        """
+        return 'capture: %d of %d frames captured, %d written, %d dropped, %d death clips' % (
+            self.captured, self.rendered, self.written, self.dropped, self.clips)
+
+
+def loadFrames(path):
+    """
+    Memory-maps a raw frame file.
+
+    :param path: a .rgb file written by FrameCapture
+    :return: read-only (frames, height, width, 3) uint8 array
+    """
+    with open(os.path.splitext(path)[0] + '.json') as f:
+        shape = json.load(f)
+    return np.memmap(path, dtype=np.uint8, mode='r', shape=(shape['frames'], shape['height'], shape['width'], 3))
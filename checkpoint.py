@@ -0,0 +1,262 @@
+import glob
+import os
+import struct
+import zlib
+
+import numpy as np
+
+"""
+ - checkpoint:
+ Saves perceptron training to disk, so long runs survive crashes and can be analyzed afterwards.
+    - A checkpoint holds the weights, death count, learning rate and best score, in a small versioned binary file
+      with a CRC. Files are written to a temporary name, synced and renamed, so a crash never leaves a half-written one
+    - Checkpointer saves one every N deaths as perceptron-<deaths>.ckpt, keeps the last few,
+      and on start-up resumes from the newest one that reads back intact
+    - The weight history is an append-only file of fixed-size rows (death, score, death cause, weights),
+      one per death (the perceptron updates its weights once per death).
+      readHistory() memory-maps it, so millions of rows can be scanned without reading them all into RAM
+
+ Checkpoint layout (little endian):
+    header: magic b'DCKP', version (u8), inputs (u16), deaths (u64), learning rate (f64), best score (u32)
+    weights: inputs f64
+    crc32 of everything before it (u32)
+ History layout: header magic b'DWHS', version (u8), pad (u8), inputs (u16), then rows of historyDtype(inputs)
+"""
+
+CHECKPOINT_MAGIC = b'DCKP'
+CHECKPOINT_VERSION = 1
+CHECKPOINT = struct.Struct('<4sBHQdI')
+HISTORY_MAGIC = b'DWHS'
+HISTORY_VERSION = 1
+HISTORY = struct.Struct('<4sBBH')
+
+# how the dino died, from the same state the perceptron learns from
+CAUSE_WAITED = 0  # on the ground, it didn't jump
+CAUSE_RISING = 1  # jumped and hit the obstacle going up
+CAUSE_FALLING = 2  # jumped and came down on the obstacle
+
+
+def historyDtype(n_inputs):
+    """
+    :return: the NumPy dtype of one weight-history row
+    """
+    return np.dtype([('death', '<u8'), ('score', '<u4'), ('cause', 'u1'), ('w', '<f8', (n_inputs,))])
+
+
+def deathCause(state) -> int:
+    """
+    :param state: the game state on the frame the dino died
+    :return: one of the CAUSE_ constants
+    """
+    if state['on_ground']:
+        return CAUSE_WAITED
+    return CAUSE_RISING if state['dino'].dy <= 0 else CAUSE_FALLING
+
+
+def writeCheckpoint(path, w, deaths, lr, best_score):
+    """
+    Writes a checkpoint atomically.
+
+    :param path: the checkpoint file
+    :param w: weight vector
+    :param deaths: death count
+    :param lr: learning rate
+    :param best_score: best score so far
+    """
+    w = np.asarray(w, dtype='<f8')
+    data = CHECKPOINT.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, len(w), deaths, lr, best_score) + w.tobytes()
+    data += struct.pack('<I', zlib.crc32(data))
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def readCheckpoint(path):
+    """
+    :param path: a checkpoint file
+    :return: dict with w, deaths, lr and best_score
+    :raises ValueError: if the file is not an intact checkpoint of this version
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < CHECKPOINT.size + 4 or zlib.crc32(data[:-4]) != struct.unpack_from('<I', data, len(data) - 4)[0]:
+        raise ValueError('%s is truncated or corrupt' % path)
+    magic, version, n, deaths, lr, best_score = CHECKPOINT.unpack_from(data)
+    if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION or len(data) != CHECKPOINT.size + 8 * n + 4:
+        raise ValueError('%s is not a version %d checkpoint' % (path, CHECKPOINT_VERSION))
+    w = np.frombuffer(data, dtype='<f8', count=n, offset=CHECKPOINT.size).astype(np.float64)
+    return {'w': w, 'deaths': deaths, 'lr': lr, 'best_score': best_score}
+
+
+def listCheckpoints(directory):
+    """
+    :return: the checkpoint files in a directory, oldest first
+    """
+    return sorted(glob.glob(os.path.join(directory, 'perceptron-*.ckpt')))
+
+
+def readHistory(path):
+    """
+    Memory-maps a weight-history file. A row cut short by a crash is left out.
+
+    :param path: the history file
+    :return: read-only structured array of rows (fields death, score, cause, w)
+    """
+    with open(path, 'rb') as f:
+        magic, version, _, n = HISTORY.unpack(f.read(HISTORY.size))
+    if magic != HISTORY_MAGIC or version != HISTORY_VERSION:
+        raise ValueError('%s is not a version %d weight history' % (path, HISTORY_VERSION))
+    dtype = historyDtype(n)
+    rows = (os.path.getsize(path) - HISTORY.size) // dtype.itemsize
+    if rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=HISTORY.size, shape=(rows,))
+
+
+class HistoryWriter:
+    """
+    Appends rows to a weight-history file.
+    """
+
+    def __init__(self, path, n_inputs):
+        """
+        :param path: the history file, created with its header if it doesn't exist,
+                     or started again if it isn't a history of weight vectors of this length
+        :param n_inputs: length of the weight vectors
+        """
+        self.path = path
+        self.row = np.zeros(1, dtype=historyDtype(n_inputs))
+        header = None
+        if os.path.exists(path) and os.path.getsize(path) >= HISTORY.size:
+            with open(path, 'rb') as f:
+                header = HISTORY.unpack(f.read(HISTORY.size))
+        if header != (HISTORY_MAGIC, HISTORY_VERSION, 0, n_inputs):
+            with open(path, 'wb') as f:
+                f.write(HISTORY.pack(HISTORY_MAGIC, HISTORY_VERSION, 0, n_inputs))
+        self.f = open(path, 'r+b')
+        self.truncate()
+
+    def truncate(self, after_death=None):
+        """
+        Drops a partly written last row, and optionally every row past a death count
+        (the rows a crashed run wrote after the checkpoint it is resumed from).
+
+        :param after_death: keep only rows up to this death, None to keep them all
+        """
+        rows = readHistory(self.path)
+        keep = len(rows)
+        if after_death is not None:
+            keep = int(np.searchsorted(rows['death'], after_death, side='right'))
+        del rows
+        self.f.truncate(HISTORY.size + keep * self.row.itemsize)
+        self.f.seek(0, os.SEEK_END)
+
+    def append(self, death, score, cause, w):
+        """
+        Appends one row and flushes it to the file.
+        """
+        row = self.row[0]
+        row['death'] = death
+        row['score'] = score
+        row['cause'] = cause
+        row['w'] = w
+        self.f.write(self.row.tobytes())
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class Checkpointer:
+    """
+    Watches a learning controller (Perceptron or PolicyPerceptron) and saves its training as it goes.
+    """
+
+    def __init__(self, controls, directory, every=100, keep=3, history=True, resume=True):
+        """
+        :param controls: the controller, it needs w, deaths and a learning rate (lr, or core.lr)
+        :param directory: where the checkpoints and history.bin go
+        :param every: deaths between checkpoints
+        :param keep: how many checkpoints to keep
+        :param history: write the weight history
+        :param resume: load the newest intact checkpoint into the controller first
+        """
+        self.controls = controls
+        self.directory = directory
+        self.every = every
+        self.keep = keep
+        self.best_score = 0
+        self.resumed = None
+        os.makedirs(directory, exist_ok=True)
+        if resume:
+            self.resume()
+        self.deaths = controls.deaths
+        self.history = HistoryWriter(os.path.join(directory, 'history.bin'), len(controls.w)) if history else None
+        if self.history is not None:
+            # death numbers restart with the controller when nothing was resumed
+            self.history.truncate(self.deaths if self.resumed is not None else 0)
+
+    @property
+    def core(self):
+        # the object holding the learning rate
+        return getattr(self.controls, 'core', self.controls)
+
+    def resume(self):
+        """
+        Loads the newest checkpoint that reads back intact and has as many weights as the controller.
+
+        :return: its path, or None if there is none
+        """
+        for path in reversed(listCheckpoints(self.directory)):
+            try:
+                ckpt = readCheckpoint(path)
+                if len(ckpt['w']) != len(self.controls.w):
+                    raise ValueError('%s has %d weights, the controller %d' % (path, len(ckpt['w']), len(self.controls.w)))
+            except ValueError:
+                continue
+            self.controls.w[:] = ckpt['w']
+            self.controls.deaths = ckpt['deaths']
+            self.core.lr = ckpt['lr']
+            self.best_score = ckpt['best_score']
+            self.resumed = path
+            return path
+        return None
+
+    def update(self, state):
+        """
+        Call after every controller tick: records a death, and saves a checkpoint every N deaths.
+
+        :param state: the game state
+        """
+        if self.controls.deaths == self.deaths:
+            return
+        self.deaths = self.controls.deaths
+        self.best_score = max(self.best_score, state['score'])
+        if self.history is not None:
+            self.history.append(self.deaths, state['score'], deathCause(state), self.controls.w)
+        if self.deaths % self.every == 0:
+            self.save()
+
+    def save(self):
+        """
+        Writes a checkpoint now, and deletes the oldest beyond the ones to keep.
+
+        :return: the checkpoint path
+        """
+        path = os.path.join(self.directory, 'perceptron-%010d.ckpt' % self.deaths)
+        writeCheckpoint(path, self.controls.w, self.deaths, self.core.lr, self.best_score)
+        for old in listCheckpoints(self.directory)[:-self.keep]:
+            os.remove(old)
+        return path
+
+    def close(self):
+        """
+        Saves a last checkpoint and closes the history.
+        """
+        self.save()
+        if self.history is not None:
+            self.history.close()
+            self.history = None
@@ -1,4 +1,5 @@
-import pygame as pg
+import time
+from collections import deque
 
 
 class Controller:
@@ -84,6 +85,8 @@ class KeyboardController(Controller):
 
         :param state: does nothing.
         """
+        # imported here so the simulation can run without pygame
+        import pygame as pg
         self.keys = pg.key.get_pressed()
 
     def source(self, control):
@@ -94,3 +97,114 @@ class KeyboardController(Controller):
         :return: true if the key is pressed, false otherwise
         """
         return self.keys[control]
+
+
+class EventKeyboardController(Controller):
+    """
+    A keyboard Controller driven by the pygame event queue instead of key state polling.
+    Every press and release is seen, even a tap shorter than a tick: a control reads true while its key is held,
+    and for the tick after a press. Presses are timestamped when they are taken off the queue, and the time
+    from there to the tick that first outputs a jump is kept as the input latency.
+    """
+
+    def __init__(self, scheme: list, latency_controls=('jump',), history=1024):
+        """
+        :param scheme: list of (name, key code) tuples
+        :param latency_controls: names of the controls whose press-to-tick latency is measured
+        :param history: how many latency samples are kept
+        """
+        self.down = set()  # keys held
+        self.taps = set()  # keys pressed before the last tick, read by source()
+        self.new_taps = set()  # keys pressed since the last tick
+        self.presses = {}  # key -> presses not taken by pressed() yet
+        self.releases = {}  # key -> releases not taken by released() yet
+        self.press_times = {}  # latency key -> time of its oldest press not output by a tick yet
+        self.latency_keys = set()
+        self.latencies = deque(maxlen=history)  # seconds
+        self.quit = False
+        super().__init__(scheme)
+        self.keys = dict(self.controls)
+        self.latency_keys = {self.keys[name] for name in latency_controls if name in self.keys}
+
+    def poll(self):
+        """
+        Takes every event off the queue. Ticks poll on their own,
+        call this in between (while waiting for the next frame) to pick input up, and timestamp it, sooner.
+        """
+        # imported here so the simulation can run without pygame
+        import pygame as pg
+        now = time.perf_counter()
+        for event in pg.event.get():
+            if event.type == pg.KEYDOWN:
+                key = event.key
+                if key in self.down:
+                    continue
+                self.down.add(key)
+                self.new_taps.add(key)
+                self.presses[key] = self.presses.get(key, 0) + 1
+                if key in self.latency_keys:
+                    self.press_times.setdefault(key, now)
+            elif event.type == pg.KEYUP:
+                self.down.discard(event.key)
+                self.releases[event.key] = self.releases.get(event.key, 0) + 1
+            elif event.type == pg.QUIT:
+                self.quit = True
+
+    def update(self, state=None):
+        """
+        Polls the queue, and makes the presses since the last tick visible to this tick.
+
+        :param state: does nothing.
+        """
+        if not self.controls:
+            # still in Controller.__init__
+            return
+        self.poll()
+        self.taps, self.new_taps = self.new_taps, self.taps
+        self.new_taps.clear()
+        if self.press_times:
+            now = time.perf_counter()
+            for key in self.taps:
+                pressed_at = self.press_times.pop(key, None)
+                if pressed_at is not None:
+                    self.latencies.append(now - pressed_at)
+
+    def source(self, control):
+        """
+        :param control: the key code
+        :return: true while the key is held, and on the tick after it was pressed
+        """
+        return control in self.down or control in self.taps
+
+    def pressed(self, name) -> bool:
+        """
+        Edge query: whether a control's key was pressed since the last call for it,
+        so a toggle flips once per press however long the key is held.
+
+        :param name: the control name
+        """
+        return self.presses.pop(self.keys[name], 0) > 0
+
+    def released(self, name) -> bool:
+        """
+        Edge query: whether a control's key was released since the last call for it.
+
+        :param name: the control name
+        """
+        return self.releases.pop(self.keys[name], 0) > 0
+
+    def latency(self):
+        """
+        :return: dict with the number of samples and the p50, p95 and max press-to-tick latency in ms,
+                 None when there are no samples
+        """
+        if not self.latencies:
+            return None
+        samples = sorted(self.latencies)
+        n = len(samples)
+        return {
+            'samples': n,
+            'p50': samples[n // 2] * 1000,
+            'p95': samples[min(n - 1, int(n * 0.95))] * 1000,
+            'max': samples[-1] * 1000
+        }
@@ -0,0 +1,239 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from controller import Controller
+from perceptron import N_INPUTS, build_input_vector
+from headless import FRAME_DELAY, SCALE_FACTOR, WINDOW_SIZE, makeGame
+
+"""
+ - env:
+ A reset/step environment around AbstractDinoGame, for driving the game from RL tooling.
+    - DinoEnv owns its game and a plain Controller, so nothing outside has to touch Controller.outs
+      or the state dict. An observation is the perceptron's inputs for the first obstacle ahead
+      (zeros when there is none), then the dino's height above the ground and its vertical speed
+    - step() fills the same preallocated float32 observation array every frame,
+      the reward is the number of obstacles passed on that frame, and done is set when the dino dies
+      (or the frame limit is reached)
+    - render() draws the game with GFX, pygame is only imported and initialized on its first call
+    - VectorEnv steps many DinoEnvs, in this process or spread over worker processes.
+      Worker processes read actions from and write observations, rewards and dones to shared memory,
+      so only a one-word command crosses the pipes each step. Finished envs are reset automatically
+"""
+
+OBS_SIZE = N_INPUTS + 2
+
+
+class DinoEnv:
+    """
+    One headless dino game with a reset/step API. Action 1 jumps, 0 does nothing.
+    """
+
+    def __init__(self, seed=None, max_frames=None, scale_factor=SCALE_FACTOR, frame_delay=FRAME_DELAY):
+        """
+        :param seed: game seed, None for random courses
+        :param max_frames: frame limit per episode, None for none
+        :param scale_factor: scale factor of the (imaginary) display
+        :param frame_delay: frame delay the game constants are tuned to
+        """
+        self.ctrl = Controller([('play', None), ('jump', None)])
+        self.game = makeGame(self.ctrl, scale_factor, frame_delay, seed)
+        self.state = self.game.getGameState()
+        self.state['freeze'] = True
+        self.max_frames = max_frames
+        self.obs = np.zeros(OBS_SIZE, dtype=np.float32)
+        self.info = {'score': 0, 'frames': 0, 'truncated': False}
+        self.graphics = None
+
+    def observe(self):
+        """
+        Fills the observation array from the current game state.
+
+        :return: the observation array
+        """
+        dino = self.game.dino
+        obst = self.state['next_obstacle']
+        if obst is not None:
+            build_input_vector(obst, self.state, self.obs[:N_INPUTS])
+        else:
+            self.obs[:N_INPUTS] = 0
+        self.obs[N_INPUTS] = self.game.gnd - dino.hitbox.bottom
+        self.obs[N_INPUTS + 1] = dino.dy
+        return self.obs
+
+    def reset(self, seed=None):
+        """
+        Starts a new episode.
+
+        :param seed: optional new game seed, the following episodes replay the courses of that seed
+        :return: the first observation
+        """
+        if seed is not None:
+            self.game.reseed(seed)
+        self.game.reset()
+        self.state['playing'] = True
+        self.info['score'] = 0
+        self.info['frames'] = 0
+        self.info['truncated'] = False
+        return self.observe()
+
+    def step(self, action):
+        """
+        Runs one frame.
+
+        :param action: true (or 1) to jump
+        :return: (observation, reward, done, info), the observation array and info dict are reused every step
+        """
+        score = self.state['score']
+        self.ctrl['jump'] = bool(action)
+        self.game.tick()
+        reward = self.state['score'] - score
+        truncated = self.max_frames is not None and self.game.frames >= self.max_frames
+        self.info['score'] = self.state['score']
+        self.info['frames'] = self.game.frames
+        self.info['truncated'] = truncated
+        return self.observe(), reward, not self.state['playing'] or truncated, self.info
+
+    def render(self):
+        """
+        Draws the current frame in a pygame window (or on the dummy video driver).
+        """
+        if self.graphics is None:
+            import pygame as pg
+            from graphics import GFX
+            pg.display.init()
+            self.graphics = GFX(WINDOW_SIZE, self.game.sf, self.game.fd)
+            self.graphics.setGround(self.game.gnd)
+        self.graphics.draw(self.state, self.game.dino, self.state['obstacles'])
+
+    def close(self):
+        if self.graphics is not None:
+            import pygame as pg
+            pg.display.quit()
+            self.graphics = None
+
+
+def _worker(conn, shms, n, start, stop, seed, max_frames):
+    """
+    Worker process of a VectorEnv: steps envs start to stop on the shared arrays.
+    """
+    obs, actions, rewards, dones = VectorEnv.arrays(shms, n)
+    envs = [DinoEnv(None if seed is None else seed + i, max_frames) for i in range(start, stop)]
+    try:
+        while True:
+            command = conn.recv()
+            if command == 'step':
+                for i, env in enumerate(envs, start):
+                    _, rewards[i], dones[i], _ = env.step(actions[i])
+                    if dones[i]:
+                        env.reset()
+                    obs[i] = env.obs
+            elif command == 'reset':
+                for i, env in enumerate(envs, start):
+                    obs[i] = env.reset()
+            else:
+                break
+            conn.send(None)
+    finally:
+        del obs, actions, rewards, dones
+        for shm in shms:
+            shm.close()
+
+
+class VectorEnv:
+    """
+    Steps n DinoEnvs together, with batched (n, ...) arrays for actions, observations, rewards and dones.
+    """
+
+    def __init__(self, n, seed=None, max_frames=None, processes=0):
+        """
+        :param n: number of envs
+        :param seed: env i gets game seed seed + i, None for random courses
+        :param max_frames: frame limit per episode
+        :param processes: number of worker processes, 0 to step every env in this process
+        """
+        self.n = n
+        self.processes = processes
+        self.envs = []
+        self.workers = []
+        self.shms = []
+        if processes <= 0:
+            self.envs = [DinoEnv(None if seed is None else seed + i, max_frames) for i in range(n)]
+            self.obs = np.zeros((n, OBS_SIZE), dtype=np.float32)
+            self.actions = np.zeros(n, dtype=np.uint8)
+            self.rewards = np.zeros(n, dtype=np.float32)
+            self.dones = np.zeros(n, dtype=bool)
+            return
+
+        sizes = [n * OBS_SIZE * 4, n, n * 4, n]
+        self.shms = [shared_memory.SharedMemory(create=True, size=size) for size in sizes]
+        self.obs, self.actions, self.rewards, self.dones = self.arrays(self.shms, n)
+        bounds = np.linspace(0, n, processes + 1).astype(int)
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            parent, child = mp.Pipe()
+            process = mp.Process(target=_worker, args=(child, self.shms, n, start, stop, seed, max_frames), daemon=True)
+            process.start()
+            self.workers.append((process, parent))
+
+    @staticmethod
+    def arrays(shms, n):
+        """
+        :return: the (observations, actions, rewards, dones) arrays on the shared memory blocks
+        """
+        return (np.ndarray((n, OBS_SIZE), dtype=np.float32, buffer=shms[0].buf),
+                np.ndarray(n, dtype=np.uint8, buffer=shms[1].buf),
+                np.ndarray(n, dtype=np.float32, buffer=shms[2].buf),
+                np.ndarray(n, dtype=bool, buffer=shms[3].buf))
+
+    def broadcast(self, command):
+        for _, conn in self.workers:
+            conn.send(command)
+        for _, conn in self.workers:
+            conn.recv()
+
+    def reset(self):
+        """
+        Starts a new episode in every env.
+
+        :return: the (n, OBS_SIZE) observation array
+        """
+        if self.workers:
+            self.broadcast('reset')
+        else:
+            for i, env in enumerate(self.envs):
+                self.obs[i] = env.reset()
+        return self.obs
+
+    def step(self, actions):
+        """
+        Runs one frame of every env. Envs that finish are reset, and their observation is the new episode's first.
+
+        :param actions: the action of each env
+        :return: (observations, rewards, dones), arrays that are reused every step
+        """
+        self.actions[:] = actions
+        if self.workers:
+            self.broadcast('step')
+        else:
+            for i, env in enumerate(self.envs):
+                _, self.rewards[i], self.dones[i], _ = env.step(self.actions[i])
+                if self.dones[i]:
+                    env.reset()
+                self.obs[i] = env.obs
+        return self.obs, self.rewards, self.dones
+
+    def close(self):
+        """
+        Stops the workers and frees the shared memory.
+        """
+        for process, conn in self.workers:
+            conn.send('close')
+            process.join()
+        self.workers = []
+        if self.shms:
+            del self.obs, self.actions, self.rewards, self.dones
+            for shm in self.shms:
+                shm.close()
+                shm.unlink()
+            self.shms = []
@@ -0,0 +1,202 @@
+import struct
+
+from controller import Controller
+from headless import makeGame
+
+"""
+ - episode:
+ Records episodes as compact binary logs and replays them headless.
+    - An episode is its seed, one control bit per frame, the spawn events and the final score
+    - Since the seed decides the course, replaying the control bits re-simulates the exact same game,
+      and the recorded spawns and score are there to check that it did
+    - Log files are a plain sequence of episode records, so recorders can keep appending to them
+
+ Record layout (little endian):
+    header: magic b'DINO', version (u8), frame delay (u16), scale factor (f64), max copies (u8),
+            seed (u32), frames (u32), score (u32), spawn count (u32)
+    control bits: ceil(frames / 8) bytes, frame i is bit (i % 8) of byte i // 8
+    spawns: spawn count records of frame (u32), obstacle index (u8), ptero level (u8)
+"""
+
+MAGIC = b'DINO'
+VERSION = 4
+HEADER = struct.Struct('<4sBHdBIIII')
+SPAWN = struct.Struct('<IBB')
+
+
+class Episode:
+    """
+    One recorded game, from the restart to the death of the dino.
+    """
+
+    def __init__(self, seed, frame_delay, scale, jumps=None, spawns=None, score=0, max_copies=1):
+        """
+        :param seed: the episode seed the course was made from
+        :param frame_delay: frame delay of the game
+        :param scale: scale factor of the game
+        :param jumps: list of the jump control (bool) on each frame
+        :param spawns: list of (frame, obstacle index, ptero level) tuples
+        :param score: the final score
+        :param max_copies: the game's max_copies, which changes the course
+        """
+        self.seed = seed
+        self.frame_delay = frame_delay
+        self.scale = scale
+        self.jumps = jumps if jumps is not None else []
+        self.spawns = spawns if spawns is not None else []
+        self.score = score
+        self.max_copies = max_copies
+
+    def __eq__(self, other):
+        return (isinstance(other, Episode) and self.seed == other.seed and self.max_copies == other.max_copies
+                and self.jumps == other.jumps and self.spawns == other.spawns and self.score == other.score)
+
+    def toBytes(self) -> bytes:
+        """
+        Packs the episode into its binary record.
+        """
+        bits = bytearray((len(self.jumps) + 7) // 8)
+        for i, jump in enumerate(self.jumps):
+            if jump:
+                bits[i >> 3] |= 1 << (i & 7)
+        header = HEADER.pack(MAGIC, VERSION, self.frame_delay, self.scale, self.max_copies, self.seed,
+                             len(self.jumps), self.score, len(self.spawns))
+        return header + bytes(bits) + b''.join(SPAWN.pack(*spawn) for spawn in self.spawns)
+
+    @classmethod
+    def fromBytes(cls, data, offset=0):
+        """
+        Unpacks one binary record.
+
+        :param data: the bytes holding the record
+        :param offset: where the record starts
+        :return: (episode, offset just past the record)
+        """
+        magic, version, frame_delay, scale, max_copies, seed, frames, score, n_spawns = HEADER.unpack_from(data, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a version %d episode record at byte %d' % (VERSION, offset))
+        offset += HEADER.size
+
+        n_bytes = (frames + 7) // 8
+        bits = data[offset:offset + n_bytes]
+        jumps = [bool(bits[i >> 3] >> (i & 7) & 1) for i in range(frames)]
+        offset += n_bytes
+
+        spawns = [SPAWN.unpack_from(data, offset + i * SPAWN.size) for i in range(n_spawns)]
+        offset += n_spawns * SPAWN.size
+        return cls(seed, frame_delay, scale, jumps, spawns, score, max_copies), offset
+
+
+def writeEpisodes(path, episodes, append=True):
+    """
+    Writes episode records to a log file.
+
+    :param path: the log file
+    :param episodes: iterable of Episodes
+    :param append: add to the end of the file instead of replacing it
+    """
+    with open(path, 'ab' if append else 'wb') as f:
+        for episode in episodes:
+            f.write(episode.toBytes())
+
+
+def readEpisodes(path):
+    """
+    Reads every episode record in a log file.
+
+    :param path: the log file
+    :return: list of Episodes
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    episodes = []
+    offset = 0
+    while offset < len(data):
+        episode, offset = Episode.fromBytes(data, offset)
+        episodes.append(episode)
+    return episodes
+
+
+class EpisodeRecorder:
+    """
+    Ticks a game in place of game.tick() and records every episode it plays.
+    """
+
+    def __init__(self, game, path=None):
+        """
+        :param game: the game to record
+        :param path: optional log file that finished episodes are appended to
+        """
+        self.game = game
+        self.path = path
+        self.current = None
+        self.episodes = []
+
+    def tick(self):
+        """
+        Ticks the game once, recording the control bit and any spawn of a played frame.
+
+        :return: the finished Episode on the frame the dino dies, otherwise None
+        """
+        game_state = self.game.getGameState()
+        playing = game_state['playing']
+        jump = bool(self.game.ctrl['jump'])
+        self.game.tick()
+
+        if not playing:
+            if game_state['playing']:
+                self.current = Episode(self.game.episode_seed, self.game.fd, self.game.sf,
+                                       max_copies=self.game.max_copies)
+            return None
+
+        self.current.jumps.append(jump)
+        if self.game.last_spawn is not None:
+            self.current.spawns.append(self.game.last_spawn)
+        if game_state['playing']:
+            return None
+
+        episode = self.current
+        episode.score = game_state['score']
+        self.current = None
+        self.episodes.append(episode)
+        if self.path is not None:
+            writeEpisodes(self.path, [episode])
+        return episode
+
+
+def replay(episode, game=None):
+    """
+    Re-simulates a recorded episode as fast as possible with no display.
+
+    :param episode: the Episode to replay
+    :param game: optional headless game to reuse, it must have been made with a plain Controller
+                 and the episode's max_copies
+    :return: the re-simulated Episode
+    """
+    if game is None:
+        game = makeGame(Controller([('play', None), ('jump', None)]), episode.scale, episode.frame_delay,
+                        max_copies=episode.max_copies)
+    game_state = game.getGameState()
+    game.reset(episode.seed)
+    game_state['playing'] = True
+
+    result = Episode(episode.seed, episode.frame_delay, episode.scale, max_copies=episode.max_copies)
+    for jump in episode.jumps:
+        game.ctrl['jump'] = jump
+        game.tick()
+        result.jumps.append(jump)
+        if game.last_spawn is not None:
+            result.spawns.append(game.last_spawn)
+        if not game_state['playing']:
+            break
+    result.score = game_state['score']
+    return result
+
+
+def verify(episode, game=None) -> bool:
+    """
+    Replays an episode and checks that it plays out exactly as recorded.
+
+    :return: true if the spawns, the length and the score all match
+    """
+    return replay(episode, game) == episode
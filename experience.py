@@ -0,0 +1,107 @@
+import numpy as np
+
+"""
+ - experience:
+ Fixed-capacity ring buffer of perceptron trigger points for batched training.
+    - Every column (features, action, label, episode, priority) is a NumPy array allocated once,
+      so adding a point never allocates and memory stays the same however long training runs
+    - When the buffer is full the oldest points are overwritten
+    - Points go in unlabelled (label 0) and are labelled later, once the obstacle is passed or the dino dies,
+      by the running count they were added at
+    - Only labelled points are sampled, uniformly or in proportion to their priority
+"""
+
+
+class ExperienceBuffer:
+    """
+    Ring buffer of (features, action, label, episode) rows.
+    """
+
+    def __init__(self, capacity: int, n_features: int, seed=None):
+        """
+        :param capacity: the most points kept at once
+        :param n_features: length of a feature vector
+        :param seed: seed for sampling
+        """
+        self.capacity = capacity
+        self.features = np.zeros((capacity, n_features), dtype=np.float32)
+        self.action = np.zeros(capacity, dtype=bool)
+        self.label = np.zeros(capacity, dtype=np.int8)  # +1 jump, -1 don't jump, 0 unlabelled
+        self.episode = np.zeros(capacity, dtype=np.int32)
+        self.priority = np.zeros(capacity, dtype=np.float32)
+        self.count = 0  # points ever added, the slot of point i is i % capacity
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def add(self, x, action: bool, episode: int) -> int:
+        """
+        Stores an unlabelled point.
+
+        :param x: feature vector
+        :param action: whether the network jumped at this point
+        :param episode: the episode (or death count) the point belongs to
+        :return: the running count of the point, for labelling it later
+        """
+        i = self.count % self.capacity
+        self.features[i] = x
+        self.action[i] = action
+        self.label[i] = 0
+        self.episode[i] = episode
+        self.priority[i] = 0
+        self.count += 1
+        return self.count - 1
+
+    def _slices(self, start: int, stop: int):
+        """
+        The buffer slices holding the points added from count start up to stop, skipping overwritten ones.
+        """
+        start = max(start, self.count - self.capacity)
+        if start >= stop:
+            return []
+        a, b = start % self.capacity, stop % self.capacity
+        if a < b:
+            return [slice(a, b)]
+        return [slice(a, self.capacity), slice(0, b)]
+
+    def setLabels(self, start: int, stop: int, jumped=0, waited=0, priority=1.0):
+        """
+        Labels a run of points, with one label for the points where the network jumped and one for the rest.
+
+        :param start: count of the first point
+        :param stop: count just past the last point
+        :param jumped: label of the points where the network jumped (0 leaves them unlabelled)
+        :param waited: label of the points where it didn't
+        :param priority: sampling priority of the newly labelled points
+        """
+        for s in self._slices(start, stop):
+            np.copyto(self.label[s], jumped, where=self.action[s])
+            np.copyto(self.label[s], waited, where=~self.action[s])
+            self.priority[s] = np.where(self.label[s] != 0, priority, 0)
+
+    def sample(self, n: int, prioritized=False, alpha=0.6):
+        """
+        Draws a batch of labelled points, with replacement.
+
+        :param n: batch size
+        :param prioritized: sample in proportion to priority ** alpha instead of uniformly
+        :param alpha: how strongly the priorities count
+        :return: (indices, features, labels), empty when nothing is labelled yet
+        """
+        size = len(self)
+        weight = self.priority[:size] ** alpha if prioritized else (self.label[:size] != 0).astype(np.float64)
+        total = np.cumsum(weight)
+        if size == 0 or total[-1] <= 0:
+            return np.zeros(0, dtype=np.int64), self.features[:0], self.label[:0]
+        idx = np.searchsorted(total, self.rng.random(n) * total[-1], side='right')
+        return idx, self.features[idx], self.label[idx]
+
+    def setPriorities(self, idx, priority):
+        """
+        Sets the priorities of sampled points, e.g. to their training error.
+
+        :param idx: indices returned by sample()
+        :param priority: new priorities
+        """
+        self.priority[idx] = np.maximum(priority, 1e-6)
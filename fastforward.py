@@ -0,0 +1,241 @@
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from perceptron import N_INPUTS, Perceptron, build_input_vector
+from headless import makeGame
+
+"""
+ - fastforward:
+ Event-driven simulation of a frozen perceptron playing the game.
+    - Most frames only move the obstacles by the same amount, so instead of ticking them one by one
+      the time to the next event is worked out in closed form and the game jumps straight to it
+    - Events are: the next spawn roll, a speed increase, the perceptron's output flipping or its triggered
+      obstacle passing the dino, the dino landing, an obstacle reaching the dino (a possible collision)
+      and an obstacle leaving the screen
+    - Every event frame is stepped with the normal game.tick, so the game plays out exactly as it would
+      frame by frame, and events worked out from float positions step the frame before them as well,
+      to stay clear of rounding
+    - Skipped frames still add dx (and the dino's dy) once per frame, not k * dx, so positions round exactly
+      as they do frame by frame and a perceptron output close to 0 can't flip
+    - checkParity plays random weight vectors on many seeds both ways, and lists the games that differ
+"""
+
+
+class FastForward:
+    """
+    Plays episodes of a game driven by a frozen Perceptron, skipping the frames where nothing happens.
+    """
+
+    def __init__(self, game, controls: Perceptron, margin=1):
+        """
+        :param game: a headless game driven by controls
+        :param controls: the perceptron playing the game, its learning should be frozen
+        :param margin: frames before every predicted event that are stepped anyway
+        """
+        self.game = game
+        self.ctrl = controls
+        self.margin = margin
+        self.state = game.getGameState()
+        self.x = np.empty(N_INPUTS, dtype=np.float32)
+        self.stepped = 0
+        self.skipped = 0
+
+    def step(self):
+        """
+        Runs one normal frame.
+        """
+        self.ctrl.tick(self.state)
+        self.game.tick()
+        self.stepped += 1
+
+    def quietFrames(self) -> int:
+        """
+        Works out how many frames from now are certain to be uneventful.
+
+        :return: number of frames that can be skipped, 0 when the next frame has to be stepped
+        """
+        game = self.game
+        dino = game.dino.hitbox
+        speed = self.state['game_speed']
+        airborne = not game.dino.on_ground
+        if not airborne and game.dino.dy != 0:
+            return 0
+
+        # the next spawn roll and speed increase are counted in whole frames, so they need no margin
+        exact = game.spawn_roll - 1
+        if speed < 40:
+            exact = min(exact, -game.frames % game.speed_increase_tick)
+        frames = [exact + self.margin]
+
+        if airborne:
+            # the frame the dino lands on
+            frames.append(self.fallFrames(game.gnd - dino.bottom))
+
+        first = None
+        for obst in game.obstacles_in_play:
+            hitbox = obst.hitbox
+            dx = obst.dx
+            if dx != -speed + obst.base_speed[0]:
+                # only spawned this frame, its speed is about to change
+                return 0
+            # leaving the screen
+            frames.append(int(hitbox.right / -dx))
+            if hitbox.right - dino.left <= 0:
+                continue
+            if first is None:
+                first = obst
+            # reaching the dino: the first frame both the x and the y ranges can overlap,
+            # while it is in the air that is when the dino has fallen down to the top of the obstacle
+            if airborne:
+                start = self.fallFrames(hitbox.top - dino.bottom)
+            elif dino.top < hitbox.bottom and hitbox.top < dino.bottom:
+                start = 0
+            else:
+                continue
+            start = max(start, int((hitbox.left - dino.right) / -dx))
+            if start <= (hitbox.right - dino.left) / -dx:
+                frames.append(start)
+
+        if not airborne and first is not None:
+            # the triggered obstacle passing the dino, and the network deciding to jump
+            frames.append(int((first.hitbox.right - dino.left) / -first.dx))
+            score = np.dot(self.ctrl.w, build_input_vector(first, self.state, self.x))
+            if score > 0:
+                return 0
+            slope = self.ctrl.w[0] * first.dx
+            if slope > 0:
+                frames.append(int(-score / slope))
+
+        return max(0, min(frames) - self.margin)
+
+    def fallFrames(self, drop) -> int:
+        """
+        Counts the frames before the airborne dino's bottom can have fallen by drop (it may be rising first).
+        After n frames it has fallen n * dy + gravity * n * (n - 1) / 2.
+
+        :param drop: distance to fall, negative when it is already below that height
+        :return: number of frames, rounded down
+        """
+        if drop <= 0:
+            return 0
+        g = self.game.gravity
+        b = self.game.dino.dy - g / 2
+        return max(0, int((-b + math.sqrt(b * b + 2 * g * drop)) / g) - 1)
+
+    def advance(self, k):
+        """
+        Jumps k uneventful frames ahead.
+
+        :param k: number of frames, at most quietFrames()
+        """
+        game = self.game
+        # k additions rather than k * dx, for the same float rounding as game.tick
+        for obst in game.obstacles_in_play:
+            box = obst.bounding_box
+            x, dx = box.x, obst.dx
+            for _ in range(k):
+                x += dx
+            box.x = x
+        dino = game.dino
+        if not dino.on_ground:
+            box = dino.bounding_box
+            y, dy, g = box.y, dino.dy, game.gravity
+            for _ in range(k):
+                y += dy
+                dy += g
+            box.y = y
+            dino.dy = dy
+        game.spawn_roll -= k
+        game.spawn_wait += k
+        game.frames += k
+        game.nextObstacle()
+        self.skipped += k
+
+    def play(self, max_frames, fast=True):
+        """
+        Plays one game from the start until the dino dies, like trainer.playEpisode.
+
+        :param max_frames: frame limit for a dino that never dies
+        :param fast: skip uneventful frames, otherwise every frame is stepped
+        :return: the score of the episode
+        """
+        self.state['playing'] = False
+        self.step()
+        done = 0
+        while done < max_frames:
+            k = min(self.quietFrames(), max_frames - done) if fast else 0
+            if k > 0:
+                self.advance(k)
+                done += k
+            else:
+                self.step()
+                done += 1
+                if not self.state['playing']:
+                    break
+        return self.state['score']
+
+
+def checkParity(weights, seeds, max_frames=20000):
+    """
+    Plays each weight vector on its seed's first course frame by frame and fast-forwarded.
+
+    :param weights: list of perceptron weight vectors
+    :param seeds: a game seed for each weight vector
+    :param max_frames: frame limit per episode
+    :return: list of (seed, weights, (score, frames) frame by frame, (score, frames) fast-forwarded)
+             for every game that played out differently
+    """
+    mismatched = []
+    for w, seed in zip(weights, seeds):
+        results = []
+        for fast in (False, True):
+            percep = Perceptron([('play', -1), ('jump', 0)])
+            percep.w = np.array(w)
+            game = makeGame(percep, seed=seed)
+            game.getGameState()['freeze'] = True
+            score = FastForward(game, percep).play(max_frames, fast)
+            results.append((score, game.frames))
+        if results[0] != results[1]:
+            mismatched.append((seed, list(w), results[0], results[1]))
+    return mismatched
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare fast-forward and frame by frame play of fixed weights.')
+    parser.add_argument('--episodes', type=int, default=20, help='number of episodes')
+    parser.add_argument('--max-frames', type=int, default=100000, help='frame limit per episode')
+    parser.add_argument('--seed', type=int, default=0, help='game seed')
+    parser.add_argument('--weights', type=float, nargs=N_INPUTS, default=[-0.1, 0.0, -1.0, 0.1, 0.2, 0.07],
+                        help='perceptron weights')
+    parser.add_argument('--fuzz', type=int, metavar='N',
+                        help='instead, check N random weight vectors on seeds SEED to SEED + N - 1 both ways')
+    args = parser.parse_args()
+
+    if args.fuzz:
+        rng = np.random.default_rng(args.seed)
+        weights = rng.normal(size=(args.fuzz, N_INPUTS))
+        mismatched = checkParity(weights, range(args.seed, args.seed + args.fuzz), args.max_frames)
+        for seed, w, stepped, fast in mismatched:
+            print('seed %d, weights %s: frame by frame score %d frames %d, fast-forward score %d frames %d'
+                  % (seed, w, stepped[0], stepped[1], fast[0], fast[1]))
+        print('%d of %d games differ' % (len(mismatched), args.fuzz))
+        sys.exit(1 if mismatched else 0)
+
+    results = {}
+    for fast in (False, True):
+        percep = Perceptron([('play', -1), ('jump', 0)])
+        percep.w = np.array(args.weights)
+        game = makeGame(percep, seed=args.seed)
+        game.getGameState()['freeze'] = True
+        ff = FastForward(game, percep)
+        start = time.perf_counter()
+        scores = [ff.play(args.max_frames, fast) for _ in range(args.episodes)]
+        results[fast] = scores
+        print('%-13s simulated frames: %9d, stepped: %9d, %.2fs, scores: %s' %
+              ('fast-forward' if fast else 'frame by frame', ff.stepped + ff.skipped, ff.stepped,
+               time.perf_counter() - start, scores))
+    print('same scores:', results[False] == results[True])
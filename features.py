@@ -0,0 +1,280 @@
+import numpy as np
+
+"""
+ - features:
+ Registered feature functions for the learners, computed for the next K obstacles ahead of the dino.
+    - A feature is a function of a view (positions and sizes of the dino and one obstacle) and of an ops namespace
+      (max, rint, where). The same function runs on Python floats for one game (SCALAR ops),
+      and on NumPy arrays for a whole BatchDinoGame (VECTOR ops), so every feature is written once
+    - Obstacle features are computed for each of the K obstacles ahead, dino features once per frame
+    - FeaturePipeline picks features by name and writes them into one preallocated array:
+      obstacle features of the first obstacle ahead, then of the second, ..., then the dino features.
+      Obstacle slots with no obstacle in them are all 0
+    - With BASELINE and K=1 the output is the same as build_input_vector
+"""
+
+
+class Ops:
+    """
+    The few functions features need that differ between floats and arrays.
+    """
+    __slots__ = ('max', 'rint', 'where')
+
+    def __init__(self, max, rint, where):
+        self.max = max
+        self.rint = rint
+        self.where = where
+
+
+SCALAR = Ops(max, round, lambda condition, a, b: a if condition else b)
+VECTOR = Ops(np.maximum, np.rint, np.where)
+
+
+class View:
+    """
+    What the features see: one obstacle (or an array of them) and the dino, as plain numbers.
+    """
+    __slots__ = ('left', 'right', 'bottom', 'w', 'h', 'approach', 'ptero', 'next_left', 'present',
+                 'dino_left', 'dino_right', 'dino_bottom', 'dino_h', 'dino_dy', 'gnd', 'speed')
+
+
+class Feature:
+    """
+    A registered feature function.
+    """
+    __slots__ = ('name', 'fn', 'per_obstacle')
+
+    def __init__(self, name, fn, per_obstacle):
+        self.name = name
+        self.fn = fn
+        self.per_obstacle = per_obstacle
+
+
+FEATURES = {}
+
+
+def feature(name, per_obstacle=True):
+    """
+    Decorator registering a feature function fn(view, ops) under a name.
+
+    :param name: the feature name
+    :param per_obstacle: computed for each obstacle ahead, otherwise once per frame from the dino
+    """
+    def register(fn):
+        FEATURES[name] = Feature(name, fn, per_obstacle)
+        return fn
+    return register
+
+
+@feature('distance')
+def distance(v, ops):
+    # from the dino's left side to the obstacle's right side
+    return v.right - v.dino_left
+
+
+@feature('height')
+def height(v, ops):
+    # of the obstacle's bottom above the ground
+    return v.gnd - v.bottom
+
+
+@feature('height_sq')
+def heightSquared(v, ops):
+    return (v.gnd - v.bottom) ** 2
+
+
+@feature('width')
+def width(v, ops):
+    return v.w
+
+
+@feature('obst_height')
+def obstacleHeight(v, ops):
+    return v.h
+
+
+@feature('speed')
+def speed(v, ops):
+    # how far the obstacle comes closer each frame
+    return v.approach
+
+
+@feature('gap')
+def gap(v, ops):
+    # free space behind the obstacle: up to the next one, or up to the right edge where the next one will spawn
+    return v.next_left - v.right
+
+
+@feature('time_to_impact')
+def timeToImpact(v, ops):
+    # frames until the obstacle reaches the dino at the current speed, 0 once it has
+    return ops.max(v.left - v.dino_right, 0) / v.approach
+
+
+@feature('ptero_level')
+def pteroLevel(v, ops):
+    # 0 for a cactus, 1 to 3 for a ptero from low to high
+    return v.ptero * (1 + ops.rint((v.gnd - v.bottom) / v.dino_h))
+
+
+@feature('present')
+def present(v, ops):
+    return v.present
+
+
+@feature('dino_dy', per_obstacle=False)
+def dinoDy(v, ops):
+    return v.dino_dy
+
+
+@feature('dino_height', per_obstacle=False)
+def dinoHeight(v, ops):
+    return v.gnd - v.dino_bottom
+
+
+@feature('game_speed', per_obstacle=False)
+def gameSpeed(v, ops):
+    return v.speed
+
+
+BASELINE = ('distance', 'height', 'height_sq', 'width', 'obst_height', 'speed')
+RICH = BASELINE + ('gap', 'time_to_impact', 'ptero_level', 'dino_dy', 'dino_height')
+
+
+class FeaturePipeline:
+    """
+    Computes a set of registered features for the next K obstacles, into a reusable array.
+    """
+
+    def __init__(self, names=BASELINE, k=1, dtype=np.float32):
+        """
+        :param names: feature names, in output order within their group
+        :param k: number of obstacles ahead to compute the obstacle features for
+        :param dtype: dtype of the output arrays
+        :raises KeyError: for a feature that isn't registered
+        """
+        for name in names:
+            if name not in FEATURES:
+                raise KeyError('unknown feature %r, expected one of %s' % (name, ', '.join(FEATURES)))
+        self.obstacle = [FEATURES[name] for name in names if FEATURES[name].per_obstacle]
+        self.dino = [FEATURES[name] for name in names if not FEATURES[name].per_obstacle]
+        self.k = k
+        self.dtype = dtype
+        self.size = k * len(self.obstacle) + len(self.dino)
+        self.out = np.zeros(self.size, dtype=dtype)
+        self.values = [0.0] * self.size
+        self.view = View()
+        self.view.present = 1.0
+
+    @property
+    def columns(self):
+        """
+        :return: the name of every output column, obstacle features are suffixed with their slot
+        """
+        return (['%s[%d]' % (f.name, i) for i in range(self.k) for f in self.obstacle]
+                + [f.name for f in self.dino])
+
+    def compute(self, state, out=None):
+        """
+        Computes the features for one game.
+
+        :param state: the game state, its obstacles are in x order and next_obstacle (at next_index) is the first one ahead
+        :param out: optional array of size self.size to fill, by default the pipeline's own array
+        :return: the filled array
+        """
+        out = self.out if out is None else out
+        v = self.view
+        dino = state['dino'].hitbox
+        v.dino_left = dino.x
+        v.dino_right = dino.x + dino.w
+        v.dino_bottom = dino.y + dino.h
+        v.dino_h = dino.h
+        v.dino_dy = state['dino'].dy
+        v.gnd = state['ground_level']
+        v.speed = speed = state['game_speed']
+
+        # the k obstacles ahead, and the one after them for the gap, read from the queue at next_obstacle's index
+        ahead = []
+        if state['next_obstacle'] is not None:
+            play = state['obstacles']
+            first = state['next_index']
+            ahead = [play[i] for i in range(first, min(len(play), first + self.k + 1))]
+
+        values = self.values
+        col = 0
+        for i in range(self.k):
+            if i < len(ahead):
+                obst = ahead[i]
+                box = obst.hitbox
+                v.left = box.x
+                v.right = box.x + box.w
+                v.bottom = box.y + box.h
+                v.w = box.w
+                v.h = box.h
+                v.approach = speed - obst.base_speed[0]
+                v.ptero = obst.name == 'ptero'
+                v.next_left = ahead[i + 1].hitbox.x if i + 1 < len(ahead) else state['display_width']
+                for f in self.obstacle:
+                    values[col] = f.fn(v, SCALAR)
+                    col += 1
+            else:
+                for _ in self.obstacle:
+                    values[col] = 0.0
+                    col += 1
+        for f in self.dino:
+            values[col] = f.fn(v, SCALAR)
+            col += 1
+        out[:] = values
+        return out
+
+    def computeBatch(self, batch, out=None):
+        """
+        Computes the features for every game of a BatchDinoGame at once.
+
+        :param batch: the BatchDinoGame
+        :param out: optional (n, self.size) array to fill
+        :return: (out, found) where found marks the games with an obstacle ahead
+        """
+        n, k = batch.n, self.k
+        if out is None:
+            out = np.empty((n, self.size), dtype=self.dtype)
+
+        # the obstacle types of the k + 1 first obstacles ahead, in spawn order (which is x order)
+        ahead = batch.obst_active & (batch.obst_x + batch.obst_w - batch.dino_x > 0)
+        order = np.where(ahead, batch.obst_order, np.iinfo(np.int64).max)
+        m = min(k + 1, batch.k)
+        idx = np.zeros((n, k + 1), dtype=np.int64)
+        present = np.zeros((n, k + 1), dtype=bool)
+        idx[:, :m] = np.argsort(order, axis=1, kind='stable')[:, :m]
+        present[:, :m] = np.take_along_axis(ahead, idx[:, :m], axis=1)
+
+        x = np.take_along_axis(batch.obst_x, idx, axis=1)
+        y = np.take_along_axis(batch.obst_y, idx, axis=1)
+        w = batch.obst_w[idx]
+        h = batch.obst_h[idx]
+        v = View()
+        v.left = x[:, :k]
+        v.right = (x + w)[:, :k]
+        v.bottom = (y + h)[:, :k]
+        v.w = w[:, :k]
+        v.h = h[:, :k]
+        v.approach = batch.game_speed[:, None] - batch.base_speed[idx[:, :k]]
+        v.ptero = batch.is_ptero[idx[:, :k]]
+        v.next_left = np.where(present[:, 1:], x[:, 1:], batch.width)
+        v.present = present[:, :k].astype(self.dtype)
+        v.dino_left = batch.dino_x
+        v.dino_right = batch.dino_x + batch.dino_w
+        v.dino_bottom = (batch.dino_y + batch.dino_h)[:, None]
+        v.dino_h = batch.dino_h
+        v.dino_dy = batch.dino_dy[:, None]
+        v.gnd = batch.gnd
+        v.speed = batch.game_speed[:, None]
+
+        f_count = len(self.obstacle)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for j, f in enumerate(self.obstacle):
+                out[:, j:k * f_count:f_count] = np.where(present[:, :k], f.fn(v, VECTOR), 0)
+        for j, f in enumerate(self.dino):
+            out[:, k * f_count + j] = np.broadcast_to(f.fn(v, VECTOR), (n, 1))[:, 0]
+        return out, present[:, 0]
+
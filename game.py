@@ -1,14 +1,19 @@
 import math
 import random
+from array import array
+from collections import deque
 
-import pygame as pg
 from controller import Controller
+from physics import Box
+from telemetry import TELEMETRY
 
 
 class GameObject:
+    __slots__ = ('name', 'bounding_box', 'hitbox', 'dx', 'dy', 'gravity', 'gnd', 'base_speed', 'on_ground', 'alive')
+
     def __init__(self, name: str, sizes: tuple, gravity, gnd: float, base_speed: tuple):
         self.name = name
-        self.bounding_box = pg.rect.Rect(0, 0, sizes[0], sizes[1])
+        self.bounding_box = Box(0.0, 0.0, sizes[0], sizes[1])
         self.hitbox = self.setHitbox()
         self.dx = 0.0
         self.dy = 0.0
@@ -20,18 +25,19 @@ class GameObject:
 
     def tick(self, obstacles: list = None, game_state: dict = None):
         # should do physics and call update
-        self.bounding_box.move_ip(self.dx, self.dy)
+        self.bounding_box.move(self.dx, self.dy)
         self.update(obstacles, game_state)
 
     def update(self, obstacles: list = None, game_state: dict = None):
         # virtual
         return
 
-    def setHitbox(self) -> pg.Rect:
+    def setHitbox(self) -> Box:
         return self.bounding_box
 
     def moveTo(self, x, y):
-        self.bounding_box.left, self.bounding_box.bottom = x, y
+        self.bounding_box.x = x
+        self.bounding_box.y = y - self.bounding_box.h
 
     def setSpeed(self, dx, dy):
         self.dx = dx + self.base_speed[0]
@@ -39,6 +45,8 @@ class GameObject:
 
 
 class Dino(GameObject):
+    __slots__ = ()
+
     def control(self, controls: Controller, jump_speed):
         # jump and duck
         if controls['jump'] and self.on_ground:
@@ -57,19 +65,58 @@ class Dino(GameObject):
 
         # collisions
         for obst in obstacles:
-            if self.hitbox.colliderect(obst.hitbox):
+            if self.hitbox.collides(obst.hitbox):
                 self.alive = False
 
 
+class GameSnapshot:
+    """
+    A saved game, taken with AbstractDinoGame.snapshot.
+    The numbers are one flat array of doubles, the rest are references to immutable values.
+    """
+    __slots__ = ('values', 'queue', 'rng', 'episode_seed', 'last_spawn')
+
+    def __init__(self, values: array, queue: tuple, rng: tuple, episode_seed, last_spawn):
+        """
+        :param values: frames, spawn timers, score, speed, flags, dino and obstacle positions (see snapshot)
+        :param queue: (pool indices of the obstacles in play in queue order,
+                       for each obstacle type the pool indices of its free copies in free list order)
+        :param rng: state of the course RNG
+        :param episode_seed: seed of the episode
+        :param last_spawn: the game's last_spawn
+        """
+        self.values = values
+        self.queue = queue
+        self.rng = rng
+        self.episode_seed = episode_seed
+        self.last_spawn = last_spawn
+
+
 class AbstractDinoGame:
     """
     An abstract version of the dino game, implementable in different configurations.
+
+    The obstacles in play are a deque in x order: new ones spawn at the right edge and are appended,
+    and the leftmost leaves the screen first, so spawning, retiring and finding the next obstacle ahead are O(1).
+    A ptero is a little faster than a cactus, but on the normal courses the spawn waits keep it from
+    catching up before the one ahead has left. On denser courses it can overtake, and the queue is sorted again
+    on the frames that happens.
     """
 
-    def __init__(self, controls: Controller, display_rect: tuple, image_sizes: dict, frame_delay: int, scale: float):
+    def __init__(self, controls: Controller, display_rect: tuple, image_sizes: dict, frame_delay: int, scale: float,
+                 seed=None, max_copies=1):
+        """
+        :param controls: the controller that plays the game
+        :param display_rect: (x, y, w, h) of the display
+        :param image_sizes: sprite sizes by name
+        :param frame_delay: frame delay the game constants are tuned to
+        :param scale: scale factor of the display
+        :param seed: game seed for the obstacle courses, None for random courses
+        :param max_copies: how many obstacles of the same type can be in play at once
+        """
         # game controller and bounding rect
         self.ctrl = controls
-        self.game_display = pg.rect.Rect(display_rect)
+        self.game_display = Box(*display_rect)
         self.image_sizes = image_sizes
 
         # game constants
@@ -79,6 +126,15 @@ class AbstractDinoGame:
         self.fd = frame_delay
         self.gnd = self.game_display.h * 0.9
 
+        # random obstacle courses: the game seed picks a seed for every episode,
+        # and the episode seed alone decides that episode's spawns
+        self.seeds = random.Random(seed)
+        self.rng = random.Random()
+        self.episode_seed = None
+        self.last_spawn = None
+        self.spawn_roll = 0  # frames until the next spawn roll hits
+        self.rng_state = None  # rng.getstate() kept for snapshots, None once rng has drawn since
+
         # kinematics constants
         self.init_velocity = 20 * self.sf * (self.fd / 30)
         self.dino_jump_velocity = -38 * self.sf * (self.fd / 30)
@@ -90,9 +146,17 @@ class AbstractDinoGame:
         # dino
         self.dino = self.initDino()
 
-        # obstacles (6 cacti and 2 pterodactyls)
+        # obstacles (6 cacti and 2 pterodactyls): obstacles has one of each type, pool every copy,
+        # and free the copies of each type that are not in play, by name
+        self.max_copies = max_copies
         self.obstacles = self.initObstacles()
-        self.obstacles_in_play = []
+        self.pool = self.obstacles + [obst for _ in range(max_copies - 1) for obst in self.initObstacles()]
+        self.pool_index = {obst: i for i, obst in enumerate(self.pool)}
+        self.free = {obst.name: [] for obst in self.obstacles}
+        self.freeAll()
+        self.obstacles_in_play = deque()
+        self.passed = 0  # obstacles at the front of the queue that are behind the dino
+        self.queue_state = None  # the queue and free lists kept for snapshots, None once they have changed since
 
         # overall game state variables
         self.state = {
@@ -101,10 +165,13 @@ class AbstractDinoGame:
             'showhb': False,
             'score': 0,
             'ground_level': self.gnd,
+            'display_width': self.game_display.w,
             'game_speed': self.init_velocity,
             'on_ground': True,
             'dino': self.dino,
-            'obstacles': self.obstacles_in_play
+            'obstacles': self.obstacles_in_play,
+            'next_obstacle': None,
+            'next_index': 0  # of next_obstacle in obstacles, set with it
         }
 
     def tick(self):
@@ -114,8 +181,8 @@ class AbstractDinoGame:
             # Increase the speed to the max
             if self.frames % self.speed_increase_tick == 0 and self.state['game_speed'] < 40:
                 self.state['game_speed'] += self.dino_accel_rate
-            if self.state['game_speed'] >= 40:
-                print('max speed')
+                if self.state['game_speed'] >= 40:
+                    TELEMETRY.info('max_speed', 'max speed')
 
             # control the dino
             self.dino.control(self.ctrl, self.dino_jump_velocity)
@@ -123,14 +190,21 @@ class AbstractDinoGame:
             # Tick the dino and all the obstacles
             self.dino.tick(obstacles=self.obstacles_in_play)
             self.state['on_ground'] = self.dino.on_ground
-            for obstacle in self.obstacles_in_play:
+            play = self.obstacles_in_play
+            ordered = True
+            last = -math.inf
+            for obstacle in play:
                 obstacle.tick()
                 obstacle.setSpeed(-1 * self.state['game_speed'], 0)
-                if obstacle.hitbox.right < 0:
-                    self.state['score'] += 1
-                    obstacle.moveTo(0, obstacle.hitbox.h)
-                    obstacle.setSpeed(0, 0)
-                    self.obstacles_in_play.remove(obstacle)
+                x = obstacle.bounding_box.x
+                if x < last:
+                    ordered = False
+                last = x
+            if not ordered:
+                self.sortObstacles()
+            # the obstacles leave the screen in queue order
+            while play and play[0].hitbox.right < 0:
+                self.retireObstacle()
 
             if self.dino.alive is False:
                 self.state['playing'] = False
@@ -140,8 +214,8 @@ class AbstractDinoGame:
 
             # Spawn new Obstacles
             self.spawnObstacle()
+            self.nextObstacle()
 
-            self.state['obstacles'] = self.obstacles_in_play
             self.spawn_wait += 1
 
             self.frames += 1
@@ -149,7 +223,6 @@ class AbstractDinoGame:
 
         else:
             if self.ctrl['play']:
-                self.frames = 0
                 self.reset()
                 self.state['playing'] = True
 
@@ -157,31 +230,207 @@ class AbstractDinoGame:
         return
 
     def spawnObstacle(self):
-        if random.randint(1, self.spawn_const) == 1:
-            index = random.randint(0, len(self.obstacles) - 1) #index =  #random.randint(0, len(self.obstacles) - 1)
+        self.last_spawn = None
+        self.spawn_roll -= 1
+        if self.spawn_roll <= 0:
+            self.rng_state = None
+            self.spawn_roll = self.rollSpawnGap()
+            index = self.rng.randint(0, len(self.obstacles) - 1) #index =  #random.randint(0, len(self.obstacles) - 1)
 
             chosen_obst = self.obstacles[index]
             min_wait = self.spawn_const #+ (2 * math.log(self.state['game_speed'] + 1))
             if chosen_obst.name == 'ptero':
                 min_wait *= 1.5
-            if self.spawn_wait > min_wait and chosen_obst not in self.obstacles_in_play:
+            free = self.free[chosen_obst.name]
+            if self.spawn_wait > min_wait and free:
                 self.spawn_wait = 0
+                obst = free.pop()
+                self.queue_state = None
+                level = 0
                 if chosen_obst.name == 'ptero':
-                    height = self.gnd - (self.dino.hitbox.h * random.randint(0, 2))
-                    chosen_obst.moveTo(self.game_display.w, height)
+                    level = self.rng.randint(0, 2)
+                    height = self.gnd - (self.dino.hitbox.h * level)
+                    obst.moveTo(self.game_display.w, height)
                 else:
-                    chosen_obst.moveTo(self.game_display.w, self.gnd)
-                self.obstacles_in_play.append(chosen_obst)
+                    obst.moveTo(self.game_display.w, self.gnd)
+                self.obstacles_in_play.append(obst)
+                self.last_spawn = (self.frames, index, level)
+
+    def retireObstacle(self):
+        """
+        Takes the leftmost obstacle out of play, scores it and puts it back in its free list.
+        """
+        obstacle = self.obstacles_in_play.popleft()
+        self.queue_state = None
+        self.state['score'] += 1
+        obstacle.moveTo(0, obstacle.hitbox.h)
+        obstacle.setSpeed(0, 0)
+        self.free[obstacle.name].append(obstacle)
+        self.passed = max(0, self.passed - 1)
+
+    def sortObstacles(self):
+        """
+        Puts the obstacles in play back in x order, after one overtook another.
+        """
+        play = sorted(self.obstacles_in_play, key=lambda obst: obst.bounding_box.x)
+        self.obstacles_in_play.clear()
+        self.obstacles_in_play.extend(play)
+        self.passed = 0
+        self.queue_state = None
+
+    def nextObstacle(self):
+        """
+        Finds the first obstacle in front of the dino (its right side past the dino's left side)
+        and stores it in the game state as next_obstacle, and its index in the queue as next_index. The queue is in x order and obstacles only move left,
+        so this only steps over the ones the dino has passed since the last call.
+        Call it after moving obstacles outside of tick.
+
+        :return: the obstacle, or None
+        """
+        play = self.obstacles_in_play
+        i = self.passed
+        n = len(play)
+        obst = None
+        if i < n:
+            left = self.dino.hitbox.x
+            for i in range(i, n):
+                box = play[i].hitbox
+                if box.x + box.w > left:
+                    obst = play[i]
+                    break
+            else:
+                i = n
+        self.passed = i
+        self.state['next_obstacle'] = obst
+        self.state['next_index'] = i
+        return obst
+
+    def freeAll(self):
+        """
+        Puts every copy of every obstacle type in its free list, lowest pool index on top.
+        """
+        for free in self.free.values():
+            free.clear()
+        for obst in reversed(self.pool):
+            self.free[obst.name].append(obst)
+
+    def rollSpawnGap(self) -> int:
+        """
+        Draws the number of frames until the next spawn roll hits.
+        Every frame hits with a 1 in spawn_const chance, so the gap is geometric,
+        and drawing it in one go tells a simulation how many frames it can skip before the next spawn.
+
+        :return: the gap in frames, at least 1
+        """
+        return 1 + int(math.log1p(-self.rng.random()) / math.log1p(-1 / self.spawn_const))
+
+    def reseed(self, seed):
+        """
+        Restarts the sequence of episode seeds, so the next episodes replay the same courses.
+
+        :param seed: the new game seed
+        """
+        self.seeds.seed(seed)
+
+    def reset(self, episode_seed=None):
+        """
+        Puts the game back to its starting state, so an episode only depends on its seed and the controls.
+
+        :param episode_seed: seed for this episode's course, by default the next one from the game seed
+        """
+        if episode_seed is None:
+            episode_seed = self.seeds.getrandbits(32)
+        self.episode_seed = episode_seed
+        self.rng.seed(episode_seed)
+        self.rng_state = None
+        self.last_spawn = None
+        self.spawn_roll = self.rollSpawnGap()
+        self.frames = 0
+        self.spawn_wait = 0
 
-    def reset(self):
         self.dino.alive = True
+        self.dino.dy = 0.0
+        self.dino.on_ground = True
         self.dino.moveTo(self.game_display.w * 0.1, self.gnd)
-        self.obstacles_in_play = []
+        for obst in self.pool:
+            obst.dx = 0.0
+        self.obstacles_in_play.clear()
+        self.freeAll()
+        self.passed = 0
+        self.queue_state = None
+        self.state['next_obstacle'] = None
+        self.state['next_index'] = 0
         self.state['playing'] = False
         self.state['score'] = 0
         self.state['game_speed'] = self.init_velocity
         self.state['on_ground'] = True
 
+    def snapshot(self) -> GameSnapshot:
+        """
+        Saves everything an episode's future depends on, cheaply enough to branch on every frame.
+        The sequence of later episode seeds and the display flags (freeze, showhb) are not part of it.
+
+        :return: a snapshot for restore()
+        """
+        if self.rng_state is None:
+            self.rng_state = self.rng.getstate()
+        dino = self.dino
+        values = [self.frames, self.spawn_wait, self.spawn_roll, self.state['score'], self.state['game_speed'],
+                  self.state['playing'], self.state['on_ground'],
+                  dino.bounding_box.x, dino.bounding_box.y, dino.dy, dino.on_ground, dino.alive]
+        for obst in self.pool:
+            values += (obst.bounding_box.x, obst.bounding_box.y, obst.dx)
+        if self.queue_state is None:
+            index = self.pool_index
+            self.queue_state = (tuple(index[obst] for obst in self.obstacles_in_play),
+                                tuple(tuple(index[obst] for obst in self.free[t.name]) for t in self.obstacles))
+        return GameSnapshot(array('d', values), self.queue_state, self.rng_state, self.episode_seed, self.last_spawn)
+
+    def restore(self, snap: GameSnapshot):
+        """
+        Puts the game back to a snapshot. The obstacles_in_play queue and the free lists are refilled in place.
+
+        :param snap: a snapshot of this game
+        """
+        values = snap.values.tolist()
+        (frames, spawn_wait, spawn_roll, score, game_speed, playing, on_ground,
+         dino_x, dino_y, dino_dy, dino_on_ground, dino_alive) = values[:12]
+        self.frames = int(frames)
+        self.spawn_wait = int(spawn_wait)
+        self.spawn_roll = int(spawn_roll)
+        self.state['score'] = int(score)
+        self.state['game_speed'] = game_speed
+        self.state['playing'] = bool(playing)
+        self.state['on_ground'] = bool(on_ground)
+        dino = self.dino
+        dino.bounding_box.x = dino_x
+        dino.bounding_box.y = dino_y
+        dino.dy = dino_dy
+        dino.on_ground = bool(dino_on_ground)
+        dino.alive = bool(dino_alive)
+        i = 12
+        pool = self.pool
+        for obst in pool:
+            obst.bounding_box.x, obst.bounding_box.y, obst.dx = values[i:i + 3]
+            i += 3
+        # the queue and free lists only need refilling when they have changed since the snapshot
+        if snap.queue is not self.queue_state:
+            order, free_lists = snap.queue
+            self.obstacles_in_play.clear()
+            self.obstacles_in_play.extend([pool[j] for j in order])
+            for t, free in zip(self.obstacles, free_lists):
+                self.free[t.name][:] = [pool[j] for j in free]
+            self.queue_state = snap.queue
+        self.passed = 0
+        self.nextObstacle()
+
+        # the RNG only needs setting when it has drawn since the snapshot
+        if snap.rng is not self.rng_state:
+            self.rng.setstate(snap.rng)
+            self.rng_state = snap.rng
+        self.episode_seed = snap.episode_seed
+        self.last_spawn = snap.last_spawn
+
     def initDino(self) -> Dino:
         dino = Dino('dino', self.image_sizes['dino'], self.gravity, self.gnd, (0, 0))
         dino.moveTo(self.game_display.w * 0.1, self.gnd)
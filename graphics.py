@@ -1,8 +1,259 @@
+import hashlib
+import json
+import os
+import struct
+import time
+from collections import deque
+
 import pygame as pg
 
+from sprites import SPRITES, SIZE_SPRITES
+
+SPRITE_SHEET = 'bin/dino_images.png'
+ATLAS_CACHE = 'bin/cache'
+ATLAS_MAGIC = b'ATL2'
+
+
+def toRect(box):
+    """
+    Converts a game object's float physics.Box to a pg.Rect for drawing
+    """
+    return pg.rect.Rect(box.x, box.y, box.w, box.h)
+
+
+def loadSprites(sheet_path, scale_factor):
+    """
+    Crops and scales every sprite out of the sprite sheet
+
+    :return: (map from sprite name to its surface, the sheet's colorkey)
+    """
+    dino_all = pg.image.load(sheet_path)
+    w = dino_all.get_width()
+    h = dino_all.get_height()
+
+    # load in the images and scale them uniformly according to scale factor
+    images = {}
+    for name, crop in SPRITES.items():
+        image = dino_all.subsurface(crop if crop is not None else (2, 104, w - 4, h - 104))
+        images[name] = pg.transform.scale(image, (image.get_width() * scale_factor, image.get_height() * scale_factor))
+    return images, dino_all.get_colorkey()
+
+
+def buildAtlas(sheet_path, scale_factor):
+    """
+    Crops and scales every sprite out of the sprite sheet and packs them into one surface,
+    in rows as wide as the widest sprite (the ground).
+    The atlas keeps the sheet's colorkey, and the space between sprites is filled with it
+
+    :return: (atlas surface, map from sprite name to its rect in the atlas)
+    """
+    images, colorkey = loadSprites(sheet_path, scale_factor)
+
+    width = max(image.get_width() for image in images.values())
+    rects = {}
+    left, top, row_h = 0, 0, 0
+    for name, image in images.items():
+        w, h = image.get_size()
+        if left + w > width:
+            left, top, row_h = 0, top + row_h, 0
+        rects[name] = pg.rect.Rect(left, top, w, h)
+        left += w
+        row_h = max(row_h, h)
+
+    atlas = pg.Surface((width, top + row_h))
+    if colorkey is not None:
+        atlas.fill(colorkey)
+        atlas.set_colorkey(colorkey)
+    for name, image in images.items():
+        atlas.blit(image, rects[name])
+    return atlas, rects
+
+
+def checkSprites(images, scale_factor, background, sheet_path=SPRITE_SHEET):
+    """
+    Blits every sprite onto a background, and the same sprite cropped and scaled straight from the sprite sheet
+    onto another, to catch an atlas that draws differently (e.g. one that lost the sheet's colorkey)
+
+    :param images: map from sprite name to the surface GFX draws
+    :param scale_factor: the scale factor the images were loaded with
+    :param background: the background color
+    :return: list of the names of the sprites that left different pixels
+    """
+    expected, _ = loadSprites(sheet_path, scale_factor)
+    mismatched = []
+    for name, image in images.items():
+        drawn = pg.Surface(image.get_size())
+        drawn.fill(background)
+        drawn.blit(image, (0, 0))
+        sheet = pg.Surface(image.get_size())
+        sheet.fill(background)
+        sheet.blit(expected[name], (0, 0))
+        if pg.image.tobytes(drawn, 'RGB') != pg.image.tobytes(sheet, 'RGB'):
+            mismatched.append(name)
+    return mismatched
+
+
+def loadAtlas(sheet_path, scale_factor, cache_dir=ATLAS_CACHE):
+    """
+    Gets the sprite atlas from the cache, which is keyed by scale factor and a hash of the sprite sheet.
+    On a miss the atlas is built and saved, as a small header (the colorkey and rect table) followed by the raw pixels,
+    so loading it again is a single read with no image decoding or scaling.
+
+    :return: (atlas surface, map from sprite name to its rect in the atlas)
+    """
+    with open(sheet_path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    path = os.path.join(cache_dir, 'atlas_%s_%s.bin' % (scale_factor, digest))
+
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, header_len = struct.unpack_from('<4sI', data)
+        if magic == ATLAS_MAGIC:
+            header = json.loads(data[8:8 + header_len])
+            pixels = memoryview(data)[8 + header_len:]
+            atlas = pg.image.frombuffer(pixels, tuple(header['size']), 'RGB')
+            if header['colorkey'] is not None:
+                atlas.set_colorkey(header['colorkey'])
+            return atlas, {name: pg.rect.Rect(rect) for name, rect in header['rects'].items()}
+
+    atlas, rects = buildAtlas(sheet_path, scale_factor)
+    colorkey = atlas.get_colorkey()
+    header = json.dumps({'size': atlas.get_size(), 'colorkey': tuple(colorkey) if colorkey is not None else None,
+                         'rects': {name: tuple(rect) for name, rect in rects.items()}})
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(struct.pack('<4sI', ATLAS_MAGIC, len(header)) + header.encode() + pg.image.tobytes(atlas, 'RGB'))
+    os.replace(tmp, path)
+    return atlas, rects
+
+
+class StatusPanel:
+    """
+    The ANN status overlay: weights, the live network output, deaths, best score and a sparkline of recent scores.
+    Each part is rendered into its own cached surface only when its text or values change,
+    and only changed parts are repainted on the panel surface, so drawing it is a single blit
+    """
+
+    def __init__(self, color, background, history=50, width=300):
+        """
+        :param color: text and line color
+        :param background: panel background color
+        :param history: how many episode scores the sparkline shows
+        :param width: panel width in pixels
+        """
+        self.color = color
+        self.background = background
+        self.width = width
+        self.font = None  # loaded on the first render
+        self.panel = None
+
+        # values, set every tick by update()
+        self.weights = ()
+        self.output = 0.0
+        self.deaths = 0
+        self.best = 0
+        self.scores = deque(maxlen=history)
+        self.playing = False
+
+        # cached parts: name -> (text, surface), and the sparkline
+        self.parts = {}
+        self.changed = set()  # parts to repaint on the panel
+        self.spark = None
+        self.spark_dirty = True
+
+    def update(self, weights, output, deaths, game_state):
+        """
+        Takes the latest values. Cheap enough to call every game tick, nothing is rendered until render()
+
+        :param weights: the network weights
+        :param output: the raw network output for the triggered obstacle
+        :param deaths: the learning controller's death count
+        :param game_state: the game state, for the score at every game over
+        """
+        self.weights = weights
+        self.output = output
+        self.deaths = deaths
+        if self.playing and not game_state['playing']:
+            self.scores.append(game_state['score'])
+            self.best = max(self.best, game_state['score'])
+            self.spark_dirty = True
+        self.playing = game_state['playing']
+
+    def text(self, name, text):
+        """
+        Returns the rendered text of a part, only rendering it again when the text changes
+        """
+        cached = self.parts.get(name)
+        if cached is None or cached[0] != text:
+            cached = (text, self.font.render(text, True, self.color, self.background))
+            self.parts[name] = cached
+            self.changed.add(name)
+        return cached[1]
+
+    def sparkline(self, size):
+        """
+        Returns the sparkline of the recent scores, only drawing it again after a new score
+        """
+        if self.spark_dirty or self.spark is None:
+            self.spark_dirty = False
+            self.changed.add('spark')
+            if self.spark is None:
+                self.spark = pg.Surface(size)
+            self.spark.fill(self.background)
+            w, h = size
+            if len(self.scores) > 1:
+                top = max(max(self.scores), 1)
+                step = (w - 1) / (self.scores.maxlen - 1)
+                points = [(i * step, h - 1 - (h - 1) * score / top) for i, score in enumerate(self.scores)]
+                pg.draw.lines(self.spark, self.color, False, points)
+        return self.spark
+
+    def render(self):
+        """
+        Brings the panel up to date with the latest values
+
+        :return: the panel surface
+        """
+        if self.font is None:
+            if not pg.font.get_init():
+                pg.font.init()
+            self.font = pg.font.Font(None, 20)
+        half = (len(self.weights) + 1) // 2
+        lines = [
+            ('w1', 'w ' + ' '.join('%+.3f' % v for v in self.weights[:half])),
+            ('w2', '  ' + ' '.join('%+.3f' % v for v in self.weights[half:])),
+            ('output', 'output %+.2f  %s' % (self.output, 'JUMP' if self.output > 0 else '')),
+            ('deaths', 'deaths %d  best %d' % (self.deaths, self.best))
+        ]
+        line_h = self.font.get_linesize()
+        spark = self.sparkline((self.width - 8, 2 * line_h))
+        if self.panel is None:
+            self.panel = pg.Surface((self.width, len(lines) * line_h + spark.get_height() + 12)).convert()
+            self.panel.fill(self.background)
+            pg.draw.rect(self.panel, self.color, self.panel.get_rect(), 1)
+            self.changed.update(name for name, _ in lines)
+        for i, (name, text) in enumerate(lines):
+            surf = self.text(name, text)
+            if name in self.changed:
+                # clear the line's strip (inside the border) and put the new text on it
+                self.panel.fill(self.background, (4, 4 + i * line_h, self.width - 8, line_h))
+                self.panel.blit(surf, (4, 4 + i * line_h))
+        if 'spark' in self.changed:
+            self.panel.blit(spark, (4, 8 + len(lines) * line_h))
+        self.changed.clear()
+        return self.panel
+
 
 class GFX:
-    def __init__(self, disp_size, disp_scale, frame_delay):
+    def __init__(self, disp_size, disp_scale, frame_delay, dirty=False, atlas_cache=True, status=False):
+        """
+        :param dirty: redraw and update only the parts of the screen that changed, instead of the whole frame
+        :param atlas_cache: load the sprites from the atlas cache instead of building them from the sprite sheet
+        :param status: draw the ANN status panel, fed with self.status.update()
+        """
+        start = time.perf_counter()
         # colors
         self.black = (0, 0, 0)
         self.white = (255, 255, 255)
@@ -16,9 +267,20 @@ class GFX:
         self.fd = frame_delay
         self.ground_level = 0
         self.disp = pg.display.set_mode(disp_size)
-        self.images, self.image_rects = self.loadImages()
+        self.images, self.image_rects = self.loadImages(atlas_cache)
         self.gnd = 0
-        self.font = pg.font.SysFont('Comic Sans MS', 30)
+        self.score_font = None  # loaded on the first use of self.font
+        self.score = None
+        self.score_text = None
+
+        # dirty rectangle mode
+        self.dirty = dirty
+        self.full_redraw = True
+        self.showhb = False
+        self.dirty_rects = []
+
+        # ANN status overlay
+        self.status = StatusPanel(self.foreground, self.background) if status else None
 
         # values
         self.dino_anim_tick = 0
@@ -27,63 +289,31 @@ class GFX:
         self.ptero_image = 'ptero_up'
         self.anim_tickstep = 1 * (self.fd / 30)
 
-    def loadImages(self):
-        """
-        Imports all the images into a dictionary
-        """
-        dino_all = pg.image.load('bin/dino_images.png')
-        w = dino_all.get_width()
-        h = dino_all.get_height()
-
-        # load in the images and scale them uniformly according to scale factor
-        ground = dino_all.subsurface((2, 104, w - 4, h - 104))
-        ground = pg.transform.scale(ground, (ground.get_width() * self.sf, ground.get_height() * self.sf))
-        game_over = dino_all.subsurface((954, 29, 380, 20))
-        game_over = pg.transform.scale(game_over, (game_over.get_width() * self.sf, game_over.get_height() * self.sf))
-        cloud = dino_all.subsurface((954, 29, 380, 20))
-        cloud = pg.transform.scale(cloud, (cloud.get_width() * self.sf, cloud.get_height() * self.sf))
-
-        dino_still = dino_all.subsurface((1338, 2, 87, 93))
-        dino_still = pg.transform.scale(dino_still, (dino_still.get_width() * self.sf, dino_still.get_height() * self.sf))
-        dino_step1 = dino_all.subsurface((1514, 2, 87, 93))
-        dino_step1 = pg.transform.scale(dino_step1, (dino_step1.get_width() * self.sf, dino_step1.get_height() * self.sf))
-        dino_step2 = dino_all.subsurface((1602, 2, 87, 93))
-        dino_step2 = pg.transform.scale(dino_step2, (dino_step2.get_width() * self.sf, dino_step2.get_height() * self.sf))
-
-        cactus1 = dino_all.subsurface((652, 2, 49, 99))
-        cactus1 = pg.transform.scale(cactus1, (cactus1.get_width() * self.sf, cactus1.get_height() * self.sf))
-        cactus2 = dino_all.subsurface((801, 2, 150, 99))
-        cactus2 = pg.transform.scale(cactus2, (cactus2.get_width() * self.sf, cactus2.get_height() * self.sf))
-        cactus3 = dino_all.subsurface((702, 2, 99, 99))
-        cactus3 = pg.transform.scale(cactus3, (cactus3.get_width() * self.sf, cactus3.get_height() * self.sf))
-        cactus4 = dino_all.subsurface((446, 2, 33, 71))
-        cactus4 = pg.transform.scale(cactus4, (cactus4.get_width() * self.sf, cactus4.get_height() * self.sf))
-        cactus5 = dino_all.subsurface((480, 2, 67, 71))
-        cactus5 = pg.transform.scale(cactus5, (cactus5.get_width() * self.sf, cactus5.get_height() * self.sf))
-        cactus6 = dino_all.subsurface((548, 2, 101, 71))
-        cactus6 = pg.transform.scale(cactus6, (cactus6.get_width() * self.sf, cactus6.get_height() * self.sf))
-
-        ptero_up = dino_all.subsurface((260, 2, 91, 79))
-        ptero_up = pg.transform.scale(ptero_up, (ptero_up.get_width() * self.sf, ptero_up.get_height() * self.sf))
-        ptero_down = dino_all.subsurface((352, 2, 91, 79))
-        ptero_down = pg.transform.scale(ptero_down, (ptero_down.get_width() * self.sf, ptero_down.get_height() * self.sf))
-
-        image_map = {
-            'ground': ground,
-            'game_over': game_over,
-            'cloud': cloud,
-            'dino_still': dino_still,
-            'dino_step1': dino_step1,
-            'dino_step2': dino_step2,
-            'cactus1': cactus1,
-            'cactus2': cactus2,
-            'cactus3': cactus3,
-            'cactus4': cactus4,
-            'cactus5': cactus5,
-            'cactus6': cactus6,
-            'ptero_up': ptero_up,
-            'ptero_down': ptero_down
-        }
+        self.startup_ms = (time.perf_counter() - start) * 1000
+
+    @property
+    def font(self):
+        """
+        The score font, loaded the first time it is needed. It is pygame's bundled font, so no font directory is scanned
+        """
+        if self.score_font is None:
+            if not pg.font.get_init():
+                pg.font.init()
+            self.score_font = pg.font.Font(None, 30)
+        return self.score_font
+
+    def loadImages(self, atlas_cache=True):
+        """
+        Imports all the images into a dictionary, as views into one sprite atlas in the display's pixel format
+        """
+        if atlas_cache:
+            atlas, rects = loadAtlas(SPRITE_SHEET, self.sf)
+        else:
+            atlas, rects = buildAtlas(SPRITE_SHEET, self.sf)
+        atlas = self.convert(atlas)
+        image_map = {name: atlas.subsurface(rect) for name, rect in rects.items()}
+        ground = image_map['ground']
+        game_over = image_map['game_over']
 
         ground_1_rect = pg.rect.Rect(0, 0, ground.get_width(), ground.get_height())
         ground_2_rect = pg.rect.Rect(ground_1_rect.right, 0, ground.get_width(), ground.get_height())
@@ -97,6 +327,19 @@ class GFX:
 
         return image_map, rect_map
 
+    def convert(self, image):
+        """
+        Converts an image to the display's pixel format, so blitting it doesn't convert it every time.
+        The colorkey is set again on the converted image
+        """
+        if image.get_flags() & pg.SRCALPHA:
+            return image.convert_alpha()
+        converted = image.convert()
+        colorkey = image.get_colorkey()
+        if colorkey is not None:
+            converted.set_colorkey(colorkey)
+        return converted
+
     def setGround(self, ground):
         self.gnd = ground
         self.image_rects['ground_1'].top = ground - self.image_rects['ground_1'].h * 1.1 * self.sf
@@ -106,26 +349,21 @@ class GFX:
         """
         Returns the sizes (shape) of the particular images that need to be exported to the game
         """
-        size_map = {
-            'dino': self.images['dino_still'].get_size(),
-            'cactus1': self.images['cactus1'].get_size(),
-            'cactus2': self.images['cactus2'].get_size(),
-            'cactus3': self.images['cactus3'].get_size(),
-            'cactus4': self.images['cactus4'].get_size(),
-            'cactus5': self.images['cactus5'].get_size(),
-            'cactus6': self.images['cactus6'].get_size(),
-            'ptero': self.images['ptero_up'].get_size()
-        }
+        size_map = {}
+        for name, sprite in SIZE_SPRITES.items():
+            size_map[name] = self.images[sprite].get_size()
         return size_map
 
-    def animate(self, game_state):
+    def animate(self, game_state, ticks=1):
+        """
+        Moves the animations on by a number of game ticks.
+        """
         # update position for ground
-        if self.image_rects['ground_2'].left <= 0:
+        self.image_rects['ground_1'].move_ip(-1 * game_state['game_speed'] * ticks, 0)
+        self.image_rects['ground_2'].move_ip(-1 * game_state['game_speed'] * ticks, 0)
+        while self.image_rects['ground_2'].left <= 0:
             self.image_rects['ground_1'].move_ip(self.image_rects['ground_1'].width, 0)
             self.image_rects['ground_2'].move_ip(self.image_rects['ground_2'].width, 0)
-        else:
-            self.image_rects['ground_1'].move_ip(-1 * game_state['game_speed'], 0)
-            self.image_rects['ground_2'].move_ip(-1 * game_state['game_speed'], 0)
 
         # update dino drawing
         if game_state['on_ground']:
@@ -146,43 +384,103 @@ class GFX:
             if self.ptero_anim_tick >= 20:
                 self.ptero_anim_tick = 0
 
-        self.dino_anim_tick += self.anim_tickstep
-        self.ptero_anim_tick += self.anim_tickstep
+        self.dino_anim_tick += self.anim_tickstep * ticks
+        self.ptero_anim_tick += self.anim_tickstep * ticks
 
-    def draw(self, game_state, dino, obstacles):
+    def scoreText(self, score):
         """
-        Draws the display for the game, given the current game state
+        Returns the rendered score, only rendering it again when the score changes
         """
-        self.disp.fill(self.background)
+        if score != self.score:
+            self.score = score
+            self.score_text = self.font.render(str(score), False, self.foreground)
+        return self.score_text
 
-        # draw scrolling ground
-        self.disp.blit(self.images['ground'], self.image_rects['ground_1'])
-        self.disp.blit(self.images['ground'], self.image_rects['ground_2'])
+    def drawScene(self, game_state, dino, obstacles, ticks):
+        """
+        Draws everything in front of the ground and moves the animations on
+
+        :return: list of the rects that were drawn to
+        """
+        rects = []
 
         # draw running dino
-        self.disp.blit(self.images[self.dino_image], dino.hitbox)
+        rects.append(self.disp.blit(self.images[self.dino_image], toRect(dino.hitbox)))
 
         # draw moving cacti
         for obst in game_state['obstacles']:
             if obst.name == 'ptero':
-                self.disp.blit(self.images[self.ptero_image], obst.hitbox)
+                rects.append(self.disp.blit(self.images[self.ptero_image], toRect(obst.hitbox)))
             else:
-                self.disp.blit(self.images[obst.name], obst.hitbox)
+                rects.append(self.disp.blit(self.images[obst.name], toRect(obst.hitbox)))
 
         if game_state['showhb']:
-            pg.draw.line(self.disp, (255, 0, 0), (0, self.gnd), (self.disp.get_width(), self.gnd))
-            pg.draw.rect(self.disp, (255, 0, 0), dino.hitbox, 1)
+            rects.append(pg.draw.line(self.disp, (255, 0, 0), (0, self.gnd), (self.disp.get_width(), self.gnd)))
+            rects.append(pg.draw.rect(self.disp, (255, 0, 0), toRect(dino.hitbox), 1))
             for obst in obstacles:
-                pg.draw.rect(self.disp, (255, 0, 0), obst.hitbox, 1)
+                rects.append(pg.draw.rect(self.disp, (255, 0, 0), toRect(obst.hitbox), 1))
 
-        text = self.font.render(str(game_state['score']), False, self.foreground)
-        self.disp.blit(text, (0, 0))
+        rects.append(self.disp.blit(self.scoreText(game_state['score']), (0, 0)))
+
+        if self.status is not None:
+            panel = self.status.render()
+            rects.append(self.disp.blit(panel, (self.disp_size[0] - panel.get_width() - 4, 4)))
 
         # update animations or disp game over
         if game_state['playing']:
-            self.animate(game_state)
+            self.animate(game_state, ticks)
         else:
             self.dino_image = 'dino_still'
-            self.disp.blit(self.images['game_over'], self.image_rects['game_over'])
+            rects.append(self.disp.blit(self.images['game_over'], self.image_rects['game_over']))
+        return rects
 
+    def drawGround(self):
+        """
+        Draws the scrolling ground
+        """
+        self.disp.blit(self.images['ground'], self.image_rects['ground_1'])
+        self.disp.blit(self.images['ground'], self.image_rects['ground_2'])
+
+    def draw(self, game_state, dino, obstacles, ticks=1):
+        """
+        Draws the display for the game, given the current game state
+
+        :param ticks: game ticks since the last draw, for the animations
+        """
+        if self.dirty:
+            self.drawDirty(game_state, dino, obstacles, ticks)
+            return
+
+        self.disp.fill(self.background)
+        self.drawGround()
+        self.drawScene(game_state, dino, obstacles, ticks)
         pg.display.flip()
+
+    def drawDirty(self, game_state, dino, obstacles, ticks=1):
+        """
+        Draws the display like draw(), but only erases, redraws and updates the parts of the screen that changed:
+        where the sprites, hitboxes and score were last frame and are this frame, and the ground strip
+        """
+        if self.full_redraw or game_state['showhb'] != self.showhb:
+            # the first frame, and turning hitboxes on or off, change too much to track
+            self.full_redraw = False
+            self.showhb = game_state['showhb']
+            self.disp.fill(self.background)
+            self.drawGround()
+            self.dirty_rects = self.drawScene(game_state, dino, obstacles, ticks)
+            pg.display.flip()
+            return
+
+        # erase last frame's sprites
+        for rect in self.dirty_rects:
+            self.disp.fill(self.background, rect)
+
+        # the ground moves every frame, so its whole strip is redrawn
+        ground = self.image_rects['ground_1']
+        strip = pg.rect.Rect(0, ground.top, self.disp_size[0], ground.h)
+        self.disp.fill(self.background, strip)
+        self.drawGround()
+
+        rects = self.drawScene(game_state, dino, obstacles, ticks)
+        pg.display.update(self.dirty_rects + rects + [strip])
+        self.dirty_rects = rects
@@ -0,0 +1,113 @@
+import argparse
+import time
+
+from perceptron import N_INPUTS, Perceptron
+from policy import PolicyPerceptron
+from experience import ExperienceBuffer
+from checkpoint import Checkpointer
+from sprites import spriteSizes
+from game import AbstractDinoGame
+from features import FEATURES, FeaturePipeline
+from telemetry import LEVELS, TELEMETRY
+
+"""
+ - headless:
+ Runs the game with no display and no frame wait, for training on machines without a screen.
+    - The sprite sizes come from the sprite crop table, so no window is ever opened and no image is loaded
+    - The controller and the game are ticked back to back in a tight loop
+    - Reports the frame rate and how many times faster than real time it ran
+"""
+
+FPS = 60
+FRAME_DELAY = int((1 / FPS) * 1000)
+WINDOW_SIZE = (1400, 300)
+SCALE_FACTOR = WINDOW_SIZE[1] / 400
+
+
+def makeGame(controls, scale_factor=SCALE_FACTOR, frame_delay=FRAME_DELAY, seed=None, max_copies=1):
+    """
+    Builds a game with the same settings as main.py, but without a display.
+
+    :param controls: the controller that plays the game
+    :param scale_factor: scale factor of the (imaginary) display
+    :param frame_delay: frame delay the game constants are tuned to
+    :param seed: game seed for the obstacle courses, None for random courses
+    :param max_copies: how many obstacles of the same type can be in play at once
+    :return: a new AbstractDinoGame
+    """
+    image_sizes = spriteSizes(scale_factor)
+    return AbstractDinoGame(controls, (0, 0) + WINDOW_SIZE, image_sizes, frame_delay, scale_factor, seed, max_copies)
+
+
+def run(game, controls, frames, checkpoint=None):
+    """
+    Ticks the controller and the game as fast as possible.
+
+    :param game: the game to run
+    :param controls: the controller driving the game, ticked with the game state each frame
+    :param frames: number of frames to simulate
+    :param checkpoint: optional Checkpointer watching the controller
+    :return: a dict of run stats (frames, seconds, fps, best score)
+    """
+    game_state = game.getGameState()
+    best = 0
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        controls.tick(game_state)
+        if checkpoint is not None:
+            checkpoint.update(game_state)
+        game.tick()
+        if game_state['score'] > best:
+            best = game_state['score']
+    seconds = time.perf_counter() - start
+
+    return {
+        'frames': frames,
+        'seconds': seconds,
+        'fps': frames / seconds if seconds > 0 else float('inf'),
+        'best_score': best
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the perceptron with no display.')
+    parser.add_argument('--frames', type=int, default=100000, help='number of frames to simulate')
+    parser.add_argument('--numpy', action='store_true', help='train the batched NumPy PolicyPerceptron')
+    parser.add_argument('--replay', type=int, default=0,
+                        help='size of the experience buffer for the NumPy PolicyPerceptron (0 for none)')
+    parser.add_argument('--features', help='comma separated features for the NumPy PolicyPerceptron, one of: %s'
+                        % ', '.join(FEATURES))
+    parser.add_argument('--lookahead', type=int, default=1, help='obstacles ahead to compute the --features for')
+    parser.add_argument('--checkpoint', help='directory to save checkpoints and the weight history to, and resume from')
+    parser.add_argument('--checkpoint-every', type=int, default=100, help='deaths between checkpoints')
+    parser.add_argument('--max-copies', type=int, default=1,
+                        help='how many obstacles of the same type can be in play at once')
+    parser.add_argument('--log-level', choices=list(LEVELS), default='info', help='the lowest message level printed')
+    parser.add_argument('--telemetry', help='JSONL file to append a record of every episode to')
+    args = parser.parse_args()
+    TELEMETRY.configure(args.log_level, args.telemetry)
+
+    percep_ctrl = [('play', -1),
+                   ('jump', 0)]
+    if args.numpy:
+        features = FeaturePipeline(args.features.split(','), args.lookahead) if args.features else None
+        n_inputs = N_INPUTS if features is None else features.size
+        buffer = ExperienceBuffer(args.replay, n_inputs) if args.replay > 0 else None
+        percep = PolicyPerceptron(percep_ctrl, buffer=buffer, features=features)
+    else:
+        percep = Perceptron(percep_ctrl)
+    game = makeGame(percep, max_copies=args.max_copies)
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = Checkpointer(percep, args.checkpoint, args.checkpoint_every)
+        if checkpoint.resumed:
+            print('resumed from %s at %d deaths' % (checkpoint.resumed, percep.deaths))
+
+    stats = run(game, percep, args.frames, checkpoint)
+    if checkpoint is not None:
+        checkpoint.close()
+    TELEMETRY.close()
+    print('frames: %d, seconds: %.2f, fps: %.0f (%.0fx real time)' %
+          (stats['frames'], stats['seconds'], stats['fps'], stats['fps'] / FPS))
+    print('deaths: %d, best score: %d, weights: %s' % (percep.deaths, stats['best_score'], percep.w))
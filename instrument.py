@@ -0,0 +1,132 @@
+import cProfile
+import pstats
+import sys
+import time
+
+import numpy as np
+
+"""
+ - instrument:
+ Opt-in timing of each stage of the main loop.
+    - FrameStats times the stages of every frame with perf_counter_ns and keeps the last few thousand
+      frames per stage in ring buffers, for p50/p95/p99 latencies
+    - Frames whose work took longer than the frame delay budget are counted
+    - A window of frames can be run under cProfile, to find where a frame time spike comes from
+    - NullStats has the same methods and does nothing, so the loop pays almost nothing when stats are off
+"""
+
+
+class NullStats:
+    """
+    Stand-in for FrameStats when instrumentation is off.
+    """
+
+    def begin(self):
+        return
+
+    def mark(self, stage):
+        return
+
+    def end(self):
+        return
+
+    def dump(self, file=None):
+        return
+
+
+class FrameStats:
+    """
+    Per-stage frame timing with rolling percentiles.
+    """
+
+    def __init__(self, budget_ms, window=4096, profile_frames=None, profile_path='frame_profile.prof'):
+        """
+        :param budget_ms: the frame delay, frames that work longer than this are counted as over budget
+        :param window: number of recent frames the percentiles are taken over
+        :param profile_frames: optional (first, last) frame numbers to run under cProfile
+        :param profile_path: where the profile of that window is saved
+        """
+        self.budget_ns = int(budget_ms * 1e6)
+        self.window = window
+        self.stages = {}  # stage name -> ring buffer of times (ns)
+        self.frames = 0
+        self.over_budget = 0
+        self.worst_ns = 0
+        self.worst_frame = 0
+        self.start = 0
+        self.last = 0
+
+        self.profile_frames = profile_frames
+        self.profile_path = profile_path
+        self.profiler = None
+
+    def begin(self):
+        """
+        Starts timing a frame.
+        """
+        if self.profile_frames is not None and self.frames == self.profile_frames[0]:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        i = self.frames % self.window
+        for times in self.stages.values():
+            times[i] = 0
+        self.start = self.last = time.perf_counter_ns()
+
+    def mark(self, stage):
+        """
+        Ends a stage: the time since the last mark (or the start of the frame) is added to this stage.
+        A stage marked more than once in a frame (e.g. once per simulation tick) adds up.
+
+        :param stage: name of the stage that just finished
+        """
+        now = time.perf_counter_ns()
+        times = self.stages.get(stage)
+        if times is None:
+            times = self.stages[stage] = np.zeros(self.window, dtype=np.int64)
+        times[self.frames % self.window] += now - self.last
+        self.last = now
+
+    def end(self):
+        """
+        Ends the frame, the time of all its stages together counts as the frame's work time.
+        """
+        work = self.last - self.start
+        if work > self.budget_ns:
+            self.over_budget += 1
+        if work > self.worst_ns:
+            self.worst_ns = work
+            self.worst_frame = self.frames
+
+        if self.profiler is not None and self.frames == self.profile_frames[1]:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path)
+            print('saved profile of frames %d-%d to %s' % (self.profile_frames + (self.profile_path,)))
+            pstats.Stats(self.profiler).sort_stats('cumulative').print_stats(15)
+            self.profiler = None
+        self.frames += 1
+
+    def summary(self) -> dict:
+        """
+        :return: dict of stage name to p50/p95/p99/max in ms, over the recent frames
+        """
+        n = min(self.frames, self.window)
+        summary = {}
+        for stage, times in self.stages.items():
+            p50, p95, p99 = np.percentile(times[:n], [50, 95, 99]) / 1e6 if n else (0.0, 0.0, 0.0)
+            summary[stage] = {'p50': p50, 'p95': p95, 'p99': p99, 'max': times[:n].max() / 1e6 if n else 0.0}
+        return summary
+
+    def dump(self, file=None):
+        """
+        Prints the stage percentiles and the over budget count.
+
+        :param file: where to print, stdout by default
+        """
+        file = file if file is not None else sys.stdout
+        print('frame stats over the last %d of %d frames (ms):' % (min(self.frames, self.window), self.frames),
+              file=file)
+        for stage, s in self.summary().items():
+            print('  %-10s p50 %7.3f  p95 %7.3f  p99 %7.3f  max %7.3f' % (stage, s['p50'], s['p95'], s['p99'],
+                                                                          s['max']), file=file)
+        print('  %d frames over the %.1f ms budget, worst %.3f ms at frame %d' %
+              (self.over_budget, self.budget_ns / 1e6, self.worst_ns / 1e6, self.worst_frame), file=file)
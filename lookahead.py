@@ -0,0 +1,120 @@
+import argparse
+import time
+
+from controller import Controller
+from headless import makeGame
+
+"""
+ - lookahead:
+ A search-based controller that tries its options out on the game itself.
+    - Before every decision on the ground it snapshots the game, plays short rollouts
+      of each option and restores the game after each one
+    - The options are: never jump, jump next frame, jump now. Waiting is picked while waiting
+      (or jumping a frame later) still survives the horizon, so the dino jumps at the last safe moment
+    - With no surviving option it picks the one that dies last
+"""
+
+
+class LookaheadController(Controller):
+    """
+    Controller that branches "jump now" vs "wait" rollouts of the game it is attached to.
+    """
+
+    def __init__(self, scheme: list, horizon=60):
+        """
+        :param scheme: list of (name, input) tuples, -1 is the restart control and 0 the jump control
+        :param horizon: frames to play out in every rollout
+        """
+        self.horizon = horizon
+        self.game = None
+        self.restart = False
+        self.y = False
+        self.rollouts = 0
+        super().__init__(scheme)
+
+    def attach(self, game):
+        """
+        :param game: the game this controller plays, and rolls out
+        """
+        self.game = game
+
+    def rollout(self, jump_at: int) -> int:
+        """
+        Plays the game forward from its current state and restores it afterwards.
+
+        :param jump_at: frame of the rollout to jump on, -1 to never jump
+        :return: frames survived, the horizon if the dino is still alive at the end
+        """
+        game = self.game
+        state = game.getGameState()
+        snap = game.snapshot()
+        survived = self.horizon
+        for frame in range(self.horizon):
+            self.outs['jump'] = frame == jump_at
+            game.tick()
+            if not state['playing']:
+                survived = frame
+                break
+        game.restore(snap)
+        self.rollouts += 1
+        return survived
+
+    def decide(self) -> bool:
+        """
+        :return: whether to jump this frame
+        """
+        wait = self.rollout(-1)
+        if wait == self.horizon:
+            return False
+        later = self.rollout(1)
+        if later == self.horizon:
+            return False
+        return self.rollout(0) > max(wait, later)
+
+    def update(self, state=None):
+        if state is None:
+            return
+        if state['playing']:
+            # jumping only does anything on the ground
+            self.y = state['on_ground'] and self.game is not None and self.decide()
+        else:
+            self.y = False
+            self.restart = True
+
+    def source(self, control):
+        if control == -1:
+            if self.restart:
+                self.restart = False
+                return True
+            return False
+        elif control == 0:
+            return self.y
+        return False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play headless games with the lookahead controller.')
+    parser.add_argument('--episodes', type=int, default=3, help='number of episodes')
+    parser.add_argument('--max-frames', type=int, default=20000, help='frame limit per episode')
+    parser.add_argument('--horizon', type=int, default=60, help='frames per rollout')
+    parser.add_argument('--seed', type=int, default=0, help='game seed')
+    args = parser.parse_args()
+
+    ctrl = LookaheadController([('play', -1), ('jump', 0)], args.horizon)
+    game = makeGame(ctrl, seed=args.seed)
+    ctrl.attach(game)
+    state = game.getGameState()
+    for _ in range(args.episodes):
+        start = time.perf_counter()
+        rollouts = ctrl.rollouts
+        state['playing'] = False
+        ctrl.tick(state)
+        game.tick()
+        for _ in range(args.max_frames):
+            ctrl.tick(state)
+            game.tick()
+            if not state['playing']:
+                break
+        seconds = time.perf_counter() - start
+        print('score: %d, frames: %d, rollouts: %d (%.0f per second)' %
+              (state['score'], game.frames, ctrl.rollouts - rollouts, (ctrl.rollouts - rollouts) / seconds))
@@ -0,0 +1,85 @@
+import time
+
+import pygame as pg
+
+"""
+ - loop:
+ Decides how many simulation ticks to run for each rendered frame.
+    - Normal mode: a fixed simulation timestep fed by an accumulator of real elapsed time,
+      so the game runs at the same speed however long drawing takes,
+      and rendering is capped at the render fps (N simulation ticks per rendered frame)
+    - Fast mode: no waiting at all, K simulation ticks per rendered frame, for watching training
+    - Given a poll function, the wait for the next frame is slept in 1 ms slices with a poll in between,
+      so input is taken off the event queue within a millisecond of arriving instead of once per frame
+"""
+
+
+class LoopScheduler:
+    """
+    Fixed-timestep scheduler built on pg.time.Clock.
+    """
+
+    def __init__(self, sim_step_ms, render_fps=60, fast_render_every=10, max_ticks=8):
+        """
+        :param sim_step_ms: length of one simulation tick in ms (the frame delay the game is tuned to)
+        :param render_fps: the most frames per second to render in normal mode
+        :param fast_render_every: simulation ticks per rendered frame in fast mode
+        :param max_ticks: the most simulation ticks to catch up in one frame, the rest of a backlog is dropped
+        """
+        self.clock = pg.time.Clock()
+        self.sim_step = sim_step_ms
+        self.render_fps = render_fps
+        self.fast_render_every = fast_render_every
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0
+        self.fast = False
+        self.frame_time = time.perf_counter()  # when the last frame's wait ended
+
+    def ticks(self, fast=False, poll=None) -> int:
+        """
+        Waits as long as this frame needs to, and returns how many simulation ticks to run before rendering it.
+
+        :param fast: run as fast as possible and render every Kth tick
+        :param poll: optional function called about every ms while waiting
+        :return: number of simulation ticks for this frame
+        """
+        if fast:
+            self.clock.tick()
+            self.accumulator = 0.0
+            self.fast = True
+            return self.fast_render_every
+
+        if self.fast:
+            # coming back from fast mode, start timing again from now
+            self.clock.tick()
+            self.fast = False
+        if poll is not None:
+            self.wait(poll)
+        self.accumulator += self.clock.tick(self.render_fps)
+        self.frame_time = time.perf_counter()
+        n = int(self.accumulator // self.sim_step)
+        self.accumulator -= n * self.sim_step
+        if n > self.max_ticks:
+            # too far behind to catch up, slow the game down instead of freezing the screen
+            n = self.max_ticks
+            self.accumulator = 0.0
+        return n
+
+    def wait(self, poll):
+        """
+        Sleeps until the last millisecond before the next frame is due, polling between 1 ms sleeps.
+        The clock sleeps the rest.
+
+        :param poll: the function to call
+        """
+        due = self.frame_time + 1 / self.render_fps - 0.001
+        while time.perf_counter() < due:
+            poll()
+            pg.time.wait(1)
+        poll()
+
+    def fps(self) -> float:
+        """
+        :return: the rendered frames per second, averaged by the clock
+        """
+        return self.clock.get_fps()
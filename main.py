@@ -1,10 +1,16 @@
+import argparse
+import atexit
 import sys
 import pygame as pg
 
 from perceptron import Perceptron
-from controller import KeyboardController
+from controller import EventKeyboardController
 from graphics import GFX
 from game import AbstractDinoGame
+from instrument import FrameStats, NullStats
+from loop import LoopScheduler
+from capture import FrameCapture
+from telemetry import LEVELS, TELEMETRY
 
 """
  - main:
@@ -41,18 +47,51 @@ from game import AbstractDinoGame
     (maybe this doesn't work an I should treat all action frames as wrong)
 """
 
+
+def printLatency(keyboard):
+    """
+    Prints the time from taking a jump press off the event queue to the game tick that reads it.
+    """
+    latency = keyboard.latency()
+    if latency is not None:
+        print('input latency over %(samples)d jumps: p50 %(p50).1f ms, p95 %(p95).1f ms, max %(max).1f ms' % latency)
+
+
 # Press the green button in the gutter to run the script.
 if __name__ == '__main__':
-    # initialize pygame
-    pg.init()
+    parser = argparse.ArgumentParser(description='The Chrome Dino Game.')
+    parser.add_argument('--stats', action='store_true', help='time each stage of the main loop (press 2 to print)')
+    parser.add_argument('--profile', type=int, nargs=2, metavar=('FIRST', 'LAST'),
+                        help='run frames FIRST to LAST under cProfile (implies --stats)')
+    parser.add_argument('--dirty', action='store_true', help='only redraw the parts of the screen that changed')
+    parser.add_argument('--render-fps', type=int, default=60, help='the most frames per second to draw')
+    parser.add_argument('--fast-render-every', type=int, default=10,
+                        help='game ticks per drawn frame while skip (left shift) is held')
+    parser.add_argument('--status', action='store_true', help='show the ANN status panel')
+    parser.add_argument('--capture', metavar='DIR', help='record the drawn frames to this directory')
+    parser.add_argument('--capture-every', type=int, default=1, help='record every Nth drawn frame')
+    parser.add_argument('--capture-format', choices=('raw', 'png'), default='raw',
+                        help='one raw RGB24 frame file (see capture.loadFrames), or a PNG per frame')
+    parser.add_argument('--capture-before-death', type=float, metavar='SECONDS',
+                        help='only record this many seconds before each death, one clip per death')
+    parser.add_argument('--log-level', choices=list(LEVELS), default='info', help='the lowest message level printed')
+    parser.add_argument('--telemetry', help='JSONL file to append a record of every episode to')
+    args = parser.parse_args()
+    TELEMETRY.configure(args.log_level, args.telemetry)
+
+    # initialize pygame, only the display: fonts are loaded when first needed
+    pg.display.init()
 
     # initialize new controller
     key_ctrl = [('play', pg.K_RETURN),
                 ('skip', pg.K_LSHIFT),
                 ('freeze', pg.K_SPACE),
                 ('hitboxes', pg.K_1),
+                ('stats', pg.K_2),
                 ('jump', pg.K_UP)]
-    keyboard = KeyboardController(key_ctrl)
+    # only the events the loop reads are queued
+    pg.event.set_allowed([pg.QUIT, pg.KEYDOWN, pg.KEYUP])
+    keyboard = EventKeyboardController(key_ctrl)
 
     # initialize perceptron
     percep_ctrl = [('play', -1),
@@ -64,7 +103,7 @@ if __name__ == '__main__':
     frame_delay = int((1 / fps) * 1000)
     window_size = (1400, 300)
     scale_factor = window_size[1] / 400
-    graphics = GFX(window_size, scale_factor, frame_delay)
+    graphics = GFX(window_size, scale_factor, frame_delay, args.dirty, status=args.status)
     image_sizes = graphics.getSizes()
 
     # initialize the game with sizes of imported sprite images
@@ -73,34 +112,71 @@ if __name__ == '__main__':
 
     graphics.setGround(game.gnd)
 
+    # optional per-frame timing of the main loop
+    if args.stats or args.profile:
+        stats = FrameStats(frame_delay, profile_frames=tuple(args.profile) if args.profile else None)
+        print('graphics start-up: %.1f ms' % graphics.startup_ms)
+        atexit.register(stats.dump)
+        atexit.register(printLatency, keyboard)
+    else:
+        stats = NullStats()
+
+    # optional recording of the drawn frames, written out on a background thread
+    capture = None
+    if args.capture:
+        capture = FrameCapture(args.capture, window_size, args.capture_every, args.capture_format,
+                               args.capture_before_death, args.render_fps)
+        atexit.register(capture.close)
+
+    # fixed game timestep, independent of how long drawing takes
+    scheduler = LoopScheduler(frame_delay, args.render_fps, args.fast_render_every)
+
     while True:
+        # wait for the next frame, and find out how many game ticks it covers
+        # the keyboard is polled while waiting, so presses are timestamped as they come in
+        ticks = scheduler.ticks(keyboard['skip'], keyboard.poll)
+
         # Exit condition:
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                sys.exit()
+        keyboard.poll()
+        if keyboard.quit:
+            sys.exit()
 
         # Main loop:
-        keyboard.tick()
-        # percep.tick(game_state)
-        game.tick()
-        graphics.draw(game_state, game.dino, game.obstacles_in_play)
+        stats.begin()
+        for _ in range(ticks):
+            keyboard.tick()
+            # percep.tick(game_state)
+            if graphics.status is not None:
+                graphics.status.update(percep.w, percep.activation, percep.deaths, game_state)
+            stats.mark('controls')
+            game.tick()
+            stats.mark('game')
+        graphics.draw(game_state, game.dino, game.obstacles_in_play, ticks)
+        stats.mark('draw')
+        if capture is not None:
+            capture.capture(graphics.disp, game_state)
+            stats.mark('capture')
+        stats.end()
 
-        # extra inputs
-        if keyboard['freeze']:
+        # extra inputs, toggled once per key press
+        if keyboard.pressed('freeze'):
             if game_state['freeze'] is False:
-                print('freezing learning...')
+                TELEMETRY.info('freeze', 'freezing learning...')
                 game_state['freeze'] = True
             else:
-                print('live')
+                TELEMETRY.info('freeze', 'live')
                 game_state['freeze'] = False
 
-        if keyboard['hitboxes']:
+        if keyboard.pressed('hitboxes'):
             if game_state['showhb'] is False:
                 game_state['showhb'] = True
             else:
                 game_state['showhb'] = False
 
-        if not keyboard['skip']:
-            pg.time.wait(frame_delay)
-            if not game_state['playing']:
-                print(percep.deaths)
+        if keyboard.pressed('stats'):
+            stats.dump()
+            if args.stats or args.profile:
+                printLatency(keyboard)
+
+        if not keyboard['skip'] and not game_state['playing']:
+            TELEMETRY.info('deaths', 'deaths: %d', percep.deaths)
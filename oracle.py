@@ -0,0 +1,251 @@
+import argparse
+import glob
+import math
+import os
+import time
+
+import numpy as np
+
+from perceptron import N_INPUTS, Perceptron
+from policy import PolicyCore
+from headless import makeGame
+from trainer import playEpisode
+
+"""
+ - oracle:
+ Labels perceptron inputs with the right answer, worked out from the jump physics instead of from deaths.
+    - JumpTable plays one jump with the game's own Dino (dino_jump_velocity and gravity), then for every
+      game speed, obstacle type and ptero level finds the range of distances where jumping now clears the obstacle
+    - A point is labelled jump (+1) once the obstacle is closer than the middle of that range,
+      and don't jump (-1) before that, or when the obstacle can't hit a dino on the ground.
+      Aiming for the middle leaves room for the frame the perceptron actually jumps on, and for speed increases
+    - sampleRows builds labelled build_input_vector rows in bulk with NumPy, writeChunks streams them
+      to disk as .npz chunks, and train runs PolicyCore.train_batch over the chunks
+"""
+
+
+class JumpTable:
+    """
+    Jump-feasibility table: for each (speed bucket, obstacle type, ptero level),
+    whether the obstacle needs a jump at all and the range of distances a jump started now clears it from.
+    """
+
+    def __init__(self, game, speed_step=None):
+        """
+        :param game: an AbstractDinoGame to take the constants and obstacle sizes from
+        :param speed_step: width of the speed buckets, by default the game's speed increase (one bucket per speed)
+        """
+        self.speed_step = speed_step if speed_step is not None else game.dino_accel_rate
+        self.min_speed = game.init_velocity
+        n_speeds = int(math.ceil((40 - self.min_speed) / self.speed_step)) + 1
+        self.speeds = self.min_speed + self.speed_step * np.arange(n_speeds)
+
+        self.dino_w = game.dino.hitbox.w
+        self.dino_h = game.dino.hitbox.h
+        self.dino_left = game.dino.hitbox.left
+        self.width = game.game_display.w
+        self.names = [obst.name for obst in game.obstacles]
+        self.obst_w = np.array([obst.hitbox.w for obst in game.obstacles], dtype=np.float64)
+        self.obst_h = np.array([obst.hitbox.h for obst in game.obstacles], dtype=np.float64)
+        self.base_speed = np.array([obst.base_speed[0] for obst in game.obstacles], dtype=np.float64)
+        self.levels = np.array([3 if name == 'ptero' else 1 for name in self.names])
+
+        self.heights = self.jumpHeights(game)
+
+        shape = (n_speeds, len(self.names), 3)
+        self.need = np.zeros(shape, dtype=bool)
+        self.d_min = np.full(shape, np.nan)
+        self.d_max = np.full(shape, np.nan)
+        for s, speed in enumerate(self.speeds):
+            for t in range(len(self.names)):
+                for level in range(self.levels[t]):
+                    self.need[s, t, level], self.d_min[s, t, level], self.d_max[s, t, level] = self.window(
+                        speed - self.base_speed[t], self.obst_w[t], self.obst_h[t], self.dino_h * level)
+
+    @staticmethod
+    def jumpHeights(game):
+        """
+        Plays one jump from the ground with a new Dino of the game.
+
+        :return: list of the height of the dino's bottom above the ground after each frame, up to the landing
+        """
+        dino = game.initDino()
+        dino.dy = game.dino_jump_velocity
+        heights = []
+        while True:
+            dino.tick(obstacles=[])
+            if dino.on_ground:
+                return heights
+            heights.append(game.gnd - dino.hitbox.bottom)
+
+    def window(self, approach, w, h, bottom):
+        """
+        Finds where a jump started now clears one obstacle.
+        On frame j of the jump the obstacle has come j * approach closer, and it overlaps the dino
+        for distances in the open range (j * approach, j * approach + w + dino width).
+
+        :param approach: how far the obstacle comes closer each frame (game speed - its base speed)
+        :param w: obstacle width
+        :param h: obstacle height
+        :param bottom: height of the obstacle's bottom above the ground
+        :return: (whether it hits a dino on the ground, nearest clearing distance, farthest clearing distance),
+                 the distances are nan when no jump clears it, and the farthest is inf when it never has to be cleared
+        """
+        need = self.dino_h > bottom and 0 < bottom + h
+        hits = [j for j, height in enumerate(self.heights) if height + self.dino_h > bottom and height < bottom + h]
+        # past the landing the dino is back on the ground, so the obstacle has to be gone by then
+        far = len(self.heights) * approach if need else math.inf
+        gaps = []
+        edge = 0.0
+        for j in hits:
+            lo, hi = j * approach, j * approach + w + self.dino_w
+            if lo > edge:
+                gaps.append((edge, min(lo, far)))
+            edge = max(edge, hi)
+        gaps.append((edge, far))
+        gaps = [(lo, hi) for lo, hi in gaps if lo < hi]
+        if not gaps:
+            return need, math.nan, math.nan
+        lo, hi = max(gaps, key=lambda gap: gap[1] - gap[0])
+        return need, lo, hi
+
+    def lookup(self, speed, index, level):
+        """
+        :param speed: game speeds (array or scalar)
+        :param index: obstacle type indices, in the order of AbstractDinoGame.obstacles
+        :param level: ptero levels (0 for cacti)
+        :return: (need, d_min, d_max) for each row
+        """
+        s = np.clip(np.rint((np.asarray(speed) - self.min_speed) / self.speed_step).astype(np.int64),
+                    0, len(self.speeds) - 1)
+        return self.need[s, index, level], self.d_min[s, index, level], self.d_max[s, index, level]
+
+    def labels(self, speed, index, level, distance):
+        """
+        :param distance: distance from the dino's left side to the obstacle's right side (input 0)
+        :return: int8 labels, +1 where the dino should be jumping by now and -1 where it should wait
+        """
+        need, d_min, d_max = self.lookup(speed, index, level)
+        return np.where(need & (np.asarray(distance) <= (d_min + d_max) / 2), 1, -1).astype(np.int8)
+
+
+def sampleRows(table: JumpTable, n: int, rng, X=None, y=None):
+    """
+    Builds labelled input rows for random speeds, obstacles, levels and distances.
+
+    :param table: the jump table to label with
+    :param n: number of rows
+    :param rng: a NumPy Generator
+    :param X: optional (n, N_INPUTS) float32 array to fill
+    :param y: optional (n,) int8 array to fill
+    :return: (X, y)
+    """
+    if X is None:
+        X = np.empty((n, N_INPUTS), dtype=np.float32)
+    if y is None:
+        y = np.empty(n, dtype=np.int8)
+    speed = table.speeds[rng.integers(0, len(table.speeds), n)]
+    index = rng.integers(0, len(table.names), n)
+    level = rng.integers(0, table.levels[index])
+    distance = rng.uniform(0, table.width + table.obst_w[index] - table.dino_left)
+    height = table.dino_h * level
+
+    # the same inputs as build_input_vector
+    X[:, 0] = distance
+    X[:, 1] = height
+    X[:, 2] = height ** 2
+    X[:, 3] = table.obst_w[index]
+    X[:, 4] = table.obst_h[index]
+    X[:, 5] = speed - table.base_speed[index]
+    y[:] = table.labels(speed, index, level, distance)
+    return X, y
+
+
+def writeChunks(directory, table: JumpTable, rows: int, chunk_rows=1 << 18, seed=None):
+    """
+    Streams labelled rows to disk, one chunk at a time, so memory use doesn't grow with the dataset.
+    Chunks left in the directory by an earlier run are deleted first, so readChunks only sees this dataset.
+
+    :param directory: where to write chunk_00000.npz, chunk_00001.npz, ...
+    :param table: the jump table to label with
+    :param rows: total number of rows
+    :param chunk_rows: rows per chunk
+    :param seed: seed for the rows
+    :return: list of the chunk paths
+    """
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, 'chunk_*.npz')):
+        os.remove(path)
+    rng = np.random.default_rng(seed)
+    X = np.empty((chunk_rows, N_INPUTS), dtype=np.float32)
+    y = np.empty(chunk_rows, dtype=np.int8)
+    paths = []
+    for start in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - start)
+        sampleRows(table, n, rng, X[:n], y[:n])
+        path = os.path.join(directory, 'chunk_%05d.npz' % len(paths))
+        np.savez(path, X=X[:n], y=y[:n])
+        paths.append(path)
+    return paths
+
+
+def readChunks(directory):
+    """
+    :param directory: a directory written by writeChunks
+    :return: generator of (X, y) chunks, in order
+    """
+    for path in sorted(glob.glob(os.path.join(directory, 'chunk_*.npz'))):
+        with np.load(path) as chunk:
+            yield chunk['X'], chunk['y']
+
+
+def train(core: PolicyCore, directory, epochs=1, batch_size=256, seed=None):
+    """
+    Trains a policy on a dataset written by writeChunks.
+
+    :param core: the PolicyCore to train
+    :param directory: the dataset directory
+    :param epochs: passes over the dataset
+    :param batch_size: rows per train_batch step
+    :param seed: seed for shuffling each chunk
+    :return: the fraction of rows misclassified in the last epoch
+    """
+    rng = np.random.default_rng(seed)
+    wrong = total = 0
+    for _ in range(epochs):
+        wrong = total = 0
+        for X, y in readChunks(directory):
+            order = rng.permutation(len(X))
+            X, y = X[order], y[order]
+            for start in range(0, len(X), batch_size):
+                wrong += core.train_batch(X[start:start + batch_size], y[start:start + batch_size])
+            total += len(X)
+    return wrong / total if total else 0.0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate an oracle-labelled dataset and train the perceptron on it.')
+    parser.add_argument('--rows', type=int, default=1000000, help='number of labelled rows')
+    parser.add_argument('--out', default='data/oracle', help='dataset directory')
+    parser.add_argument('--epochs', type=int, default=10, help='training passes over the dataset')
+    parser.add_argument('--lr', type=float, default=0.0001, help='learning rate')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the rows, the shuffling and the test games')
+    args = parser.parse_args()
+
+    percep = Perceptron([('play', -1), ('jump', 0)])
+    game = makeGame(percep, seed=args.seed)
+    game.getGameState()['freeze'] = True
+
+    start = time.perf_counter()
+    table = JumpTable(game)
+    paths = writeChunks(args.out, table, args.rows, seed=args.seed)
+    print('wrote %d rows in %d chunks in %.2fs' % (args.rows, len(paths), time.perf_counter() - start))
+
+    start = time.perf_counter()
+    core = PolicyCore(lr=args.lr)
+    error = train(core, args.out, args.epochs, seed=args.seed)
+    print('trained in %.2fs, training error %.3f, weights: %s' % (time.perf_counter() - start, error, core.w))
+
+    percep.w = core.w.copy()
+    scores = [playEpisode(game, percep, 20000) for _ in range(5)]
+    print('scores with the trained weights:', scores)
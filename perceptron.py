@@ -1,5 +1,9 @@
 
+import numpy as np
+
 from controller import Controller
+from checkpoint import deathCause
+from telemetry import TELEMETRY
 
 """
 USING RNN unsupervised learning because the controls (or state inputs)
@@ -12,42 +16,57 @@ and update its weights by force.
 """
 
 
-def build_input_vector(obst, state):
-    x = [
-        obst.hitbox.right - state['dino'].hitbox.left,
-        state['ground_level'] - obst.hitbox.bottom,
-        (state['ground_level'] - obst.hitbox.bottom) ** 2,
-        obst.hitbox.width,
-        obst.hitbox.height,
-        state['game_speed'] - obst.base_speed[0]
-    ]
-    return x
+N_INPUTS = 6
+
+
+def build_input_vector(obst, state, out=None):
+    """
+    Builds the float32 input vector of the network for one obstacle.
+
+    :param obst: the triggered obstacle
+    :param state: the game state
+    :param out: optional float32 array to fill in place of a new one
+    :return: the input vector
+    """
+    if out is None:
+        out = np.empty(N_INPUTS, dtype=np.float32)
+    hitbox = obst.hitbox
+    height = state['ground_level'] - hitbox.bottom
+    out[0] = hitbox.right - state['dino'].hitbox.left
+    out[1] = height
+    out[2] = height ** 2
+    out[3] = hitbox.width
+    out[4] = hitbox.height
+    out[5] = state['game_speed'] - obst.base_speed[0]
+    return out
 
 
 class Perceptron(Controller):
 
     def __init__(self, scheme: list):
         self.deaths = 0
+        self.frames = 0  # frames played this episode
 
         self.restart = False
-        self.w = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        self.w = np.zeros(N_INPUTS)
         self.lr = 0.0001
         self.y = False
-        self.triggers = {  # a list of trigger states (unlabeled points) for each output control (jump, duck, etc)
-            'pass': [],
-            'jump': []
+        self.activation = 0.0  # the raw network output for the triggered obstacle, 0 when there is none
+        self.triggers = {  # the last trigger state (unlabeled point) for each output control (jump, duck, etc)
+            'pass': None,
+            'jump': None
         }
         super().__init__(scheme)
 
     def run_network(self, x_vector):
-        y_vector = sum([self.w[i] * x_vector[i] for i in range(len(x_vector))])
+        y_vector = np.dot(self.w, x_vector)
+        self.activation = y_vector
         return y_vector > 0
 
     def update_weights(self, x_vector, expected=0):
         if x_vector is None or len(x_vector) <= 0:
             return
-        for i in range(len(self.w)):
-            self.w[i] += expected * self.lr * x_vector[i]  # died from jumping
+        self.w += expected * self.lr * x_vector  # died from jumping
 
     # Called by main on every tick.
     # Given a current game state to check for a trigger (like an incoming obstacle).
@@ -62,17 +81,14 @@ class Perceptron(Controller):
         # see about making sure the dino checks weights and jumps in the same tick
         # check if the dino dies, and then pull up the relevant stored trigger point
         if state['playing']:
+            self.frames += 1
             # if the dino didn't die, then run the perceptron to update the output controls
-            trgd_obst = None
-            for obst in state['obstacles']:
-                dist = obst.hitbox.right - state['dino'].hitbox.left
-                # find the first obstacle that is in front of the dino
-                if dist > 0:
-                    trgd_obst = obst
-                    break
+            # the first obstacle that is in front of the dino
+            trgd_obst = state['next_obstacle']
             # cancel when there's no obstacle
             if trgd_obst is None:
                 self.y = False
+                self.activation = 0.0
                 return
             # get inputs for this tick (point)
             x = build_input_vector(trgd_obst, state)
@@ -96,11 +112,11 @@ class Perceptron(Controller):
                 # if no-jump == die: jump sooner
                 if state['on_ground']:
                     # died going up
-                    print('dino died, jump=FALSE, with weights:', self.w)
+                    TELEMETRY.debug('death', 'dino died, jump=FALSE, with weights: %s', self.w)
                     self.update_weights(self.triggers['pass'], 1)
                 # if the dino died from not jumping the pass trigger should always be run
                 else:
-                    print('dino died, jump=TRUE, with weights:', self.w)
+                    TELEMETRY.debug('death', 'dino died, jump=TRUE, with weights: %s', self.w)
                     if state['dino'].dy <= 0:
                         # died going up
                         self.update_weights(self.triggers['jump'], 1)
@@ -108,9 +124,13 @@ class Perceptron(Controller):
                         # died going down
                         self.update_weights(self.triggers['jump'], -1)
                     #self.update_weights(self.triggers['jump'], -1)
+                if TELEMETRY.recording:
+                    TELEMETRY.record('episode', death=self.deaths, score=state['score'], frames=self.frames,
+                                     cause=deathCause(state), w=self.w.tolist())
+            self.frames = 0
             # reset the triggers and set the restart control high
-            self.triggers['jump'].clear()
-            self.triggers['pass'].clear()
+            self.triggers['jump'] = None
+            self.triggers['pass'] = None
             self.restart = True
 
     def source(self, control):
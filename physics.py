@@ -0,0 +1,64 @@
+"""
+ - physics:
+ Pygame-free collision boxes for the game simulation.
+    - Box keeps float positions, so objects move by sub-pixel amounts instead of being truncated to whole pixels
+    - It has the pg.Rect attribute names the game and the perceptron read (left, right, top, bottom, width, height),
+      and its own strict AABB overlap test, the same as pg.Rect.colliderect
+    - __slots__ keeps every box (and game object) free of a per-instance __dict__
+    - Converting to a pg.Rect only happens when drawing
+"""
+
+
+class Box:
+    """
+    Axis-aligned box with float position and size.
+    """
+    __slots__ = ('x', 'y', 'w', 'h')
+
+    def __init__(self, x, y, w, h):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+
+    def __repr__(self):
+        return 'Box(%r, %r, %r, %r)' % (self.x, self.y, self.w, self.h)
+
+    @property
+    def left(self):
+        return self.x
+
+    @property
+    def top(self):
+        return self.y
+
+    @property
+    def right(self):
+        return self.x + self.w
+
+    @property
+    def bottom(self):
+        return self.y + self.h
+
+    @property
+    def width(self):
+        return self.w
+
+    @property
+    def height(self):
+        return self.h
+
+    def move(self, dx, dy):
+        """
+        Moves the box in place.
+        """
+        self.x += dx
+        self.y += dy
+
+    def collides(self, other) -> bool:
+        """
+        :param other: another Box
+        :return: true if the boxes overlap, touching edges don't count
+        """
+        return (self.x < other.x + other.w and other.x < self.x + self.w
+                and self.y < other.y + other.h and other.y < self.y + self.h)
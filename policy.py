@@ -0,0 +1,225 @@
+import numpy as np
+
+from controller import Controller
+from perceptron import N_INPUTS, build_input_vector
+from experience import ExperienceBuffer
+from checkpoint import deathCause
+from telemetry import TELEMETRY
+
+"""
+ - policy:
+ NumPy version of the perceptron, split into a policy core and a controller around it.
+    - PolicyCore holds the weights as an array and scores one observation or a whole batch in one matmul
+    - Training works on batches of points: push() nudges the weights along the mean of a batch,
+      and train_batch() runs the perceptron rule over a batch of labelled points
+    - PolicyPerceptron is a drop-in Controller for main.py and the headless runners,
+      it keeps every on-ground trigger point of the current obstacle, not just the last one,
+      and learns from a batch of the last ones when the dino dies
+    - Given an ExperienceBuffer, it also stores every trigger point, labels them once their obstacle
+      is passed or kills the dino, and trains on a sampled batch of old points at every death
+    - Given a FeaturePipeline, it learns from those features (of several obstacles ahead) instead
+    - Like Perceptron, it queues a telemetry record of every episode when a record file is configured
+"""
+
+
+class PolicyCore:
+    """
+    A linear policy: jump when w . x > 0.
+    """
+
+    def __init__(self, n_inputs=N_INPUTS, lr=0.0001, w=None):
+        """
+        :param n_inputs: length of the input vectors
+        :param lr: learning rate
+        :param w: optional starting weights
+        """
+        self.w = np.zeros(n_inputs) if w is None else np.array(w, dtype=np.float64)
+        self.lr = lr
+
+    def predict(self, x) -> bool:
+        """
+        :param x: one input vector
+        :return: true to jump
+        """
+        return float(np.dot(self.w, x)) > 0
+
+    def scores(self, X):
+        """
+        :param X: (n, n_inputs) array of input vectors
+        :return: the raw network output of every row
+        """
+        return X @ self.w
+
+    def predict_batch(self, X):
+        """
+        :param X: (n, n_inputs) array of input vectors
+        :return: boolean array, true where the network jumps
+        """
+        return self.scores(X) > 0
+
+    def push(self, X, expected):
+        """
+        Moves the weights along the mean of a batch of points, the batched form of Perceptron.update_weights.
+
+        :param X: (n, n_inputs) array of input vectors
+        :param expected: +1 to make the network more likely to jump at these points, -1 for less likely
+        """
+        if len(X) == 0:
+            return
+        self.w += expected * self.lr * X.mean(axis=0, dtype=np.float64)
+
+    def train_batch(self, X, y):
+        """
+        One mini-batch step of the perceptron rule: only the misclassified points move the weights.
+
+        :param X: (n, n_inputs) array of input vectors
+        :param y: array of labels, +1 for jump and -1 for don't jump
+        :return: the number of misclassified points
+        """
+        if len(X) == 0:
+            return 0
+        wrong = np.where((self.scores(X) > 0) != (y > 0), y, 0).astype(np.float64)
+        self.w += self.lr * (wrong @ X) / len(X)
+        return int(np.count_nonzero(wrong))
+
+
+class PolicyPerceptron(Controller):
+    """
+    A Controller with the same scheme as Perceptron (-1 for play, 0 for jump), backed by a PolicyCore.
+    """
+
+    def __init__(self, scheme: list, core: PolicyCore = None, capacity=256, window=8,
+                 buffer: ExperienceBuffer = None, batch_size=64, prioritized=False, features=None):
+        """
+        :param scheme: control scheme, like the one Perceptron takes
+        :param core: optional PolicyCore to share, a new one by default
+        :param capacity: how many trigger points are kept per obstacle (the oldest are overwritten)
+        :param window: how many of the last trigger points before a death make up its training batch
+        :param buffer: optional experience buffer to store and replay trigger points
+        :param batch_size: points sampled from the buffer at every death
+        :param prioritized: sample the buffer by priority instead of uniformly
+        :param features: optional features.FeaturePipeline to build the inputs with, instead of build_input_vector
+        """
+        self.features = features
+        if core is None:
+            core = PolicyCore(N_INPUTS if features is None else features.size)
+        self.core = core
+        self.deaths = 0
+        self.frames = 0  # frames played this episode
+        self.restart = False
+        self.y = False
+
+        # trigger points for the obstacle the dino is facing, with whether the network jumped at each
+        self.capacity = capacity
+        self.window = window
+        self.points = np.zeros((capacity, self.core.w.shape[0]), dtype=np.float32)
+        self.jumped = np.zeros(capacity, dtype=bool)
+        self.count = 0
+        self.x = np.zeros(self.core.w.shape[0], dtype=np.float32)
+        self.trgd_obst = None
+
+        self.buffer = buffer
+        self.batch_size = batch_size
+        self.prioritized = prioritized
+        self.first_point = 0  # buffer count of the first point of the current obstacle
+        super().__init__(scheme)
+
+    @property
+    def w(self):
+        return self.core.w
+
+    @w.setter
+    def w(self, value):
+        self.core.w = np.array(value, dtype=np.float64)
+
+    def update(self, state=None):
+        if state is None:
+            return
+
+        if state['playing']:
+            self.frames += 1
+            # the first obstacle that is in front of the dino
+            trgd_obst = state['next_obstacle']
+            if trgd_obst is not self.trgd_obst:
+                # a new obstacle, the old one was passed so its points need no update
+                if self.buffer is not None:
+                    # but every choice made on the way was a good one
+                    self.buffer.setLabels(self.first_point, self.buffer.count, jumped=1, waited=-1)
+                    self.first_point = self.buffer.count
+                self.trgd_obst = trgd_obst
+                self.count = 0
+            if trgd_obst is None:
+                self.y = False
+                return
+
+            if self.features is not None:
+                x = self.features.compute(state, self.x)
+            else:
+                x = build_input_vector(trgd_obst, state, self.x)
+            self.y = self.core.predict(x)
+            if state['on_ground']:
+                i = self.count % self.capacity
+                self.points[i] = x
+                self.jumped[i] = self.y
+                self.count += 1
+                if self.buffer is not None:
+                    self.buffer.add(x, self.y, self.deaths)
+        else:
+            if not state['freeze']:
+                self.deaths += 1
+                self.learn(state)
+                if TELEMETRY.recording:
+                    TELEMETRY.record('episode', death=self.deaths, score=state['score'], frames=self.frames,
+                                     cause=deathCause(state), w=self.w.tolist())
+            self.frames = 0
+            self.count = 0
+            self.trgd_obst = None
+            if self.buffer is not None:
+                self.first_point = self.buffer.count
+            self.restart = True
+
+    def learn(self, state):
+        """
+        Updates the weights from the last trigger points before the death, one batch per call,
+        following the same rules as Perceptron.update.
+
+        :param state: the game state on the frame the dino died
+        """
+        n = min(self.count, self.capacity)
+        # the stored points, oldest first
+        order = np.arange(self.count - n, self.count) % self.capacity
+        points, jumped = self.points[order], self.jumped[order]
+        if state['on_ground']:
+            # never jumped: jump sooner
+            self.core.push(points[~jumped][-self.window:], 1)
+            labels = {'waited': 1}
+        elif state['dino'].dy <= 0:
+            # died going up: jump sooner
+            self.core.push(points[jumped][-self.window:], 1)
+            labels = {'jumped': 1}
+        else:
+            # died going down: jump later
+            self.core.push(points[jumped][-self.window:], -1)
+            labels = {'jumped': -1}
+
+        if self.buffer is not None:
+            start = max(self.first_point, self.buffer.count - self.window)
+            self.buffer.setLabels(start, self.buffer.count, **labels)
+            idx, X, y = self.buffer.sample(self.batch_size, self.prioritized)
+            self.core.train_batch(X, y)
+            if self.prioritized and len(idx):
+                # points the network still gets wrong are replayed more often
+                wrong = self.core.predict_batch(X) != (y > 0)
+                self.buffer.setPriorities(idx, np.where(wrong, 1.0, 0.1))
+
+    def source(self, control):
+        if control == -1:
+            if self.restart:
+                self.restart = False
+                return True
+            else:
+                return False
+        elif control == 0:
+            return self.y
+        else:
+            return False
@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import socket
+import struct
+import time
+
+import numpy as np
+
+from env import OBS_SIZE, DinoEnv
+
+"""
+ - server:
+ Hosts many headless games in one process for agents that run as separate processes.
+    - Agents connect over a Unix socket or TCP on localhost, and every connection gets its own DinoEnv session
+    - Requests and replies are fixed-size little endian structs:
+        request: command (u8), argument (u32): RESET with a seed (NO_SEED for the next course), STEP with an action, CLOSE
+        reply: frames (u32), score (u32), done (u8), reward (f32), then OBS_SIZE observation floats (f32)
+    - Requests from every session are collected and stepped together once per tick,
+      and with an interval set the ticks run at a fixed rate, so all sessions move in lockstep
+    - Backpressure: a session's next request is only read once its last reply is written and drained,
+      so an agent that floods or stops reading only stalls itself (the socket buffers fill up and block it),
+      and a tick steps at most max_batch requests, leaving the rest for the next tick
+"""
+
+REQUEST = struct.Struct('<BI')
+REPLY = struct.Struct('<IIBf%df' % OBS_SIZE)
+RESET, STEP, CLOSE = 0, 1, 2
+NO_SEED = 0xFFFFFFFF
+
+
+class DinoServer:
+    """
+    Asyncio server stepping every connected agent's game in batched ticks.
+    """
+
+    def __init__(self, seed=None, max_frames=None, max_batch=1024, interval=0.0):
+        """
+        :param seed: session i plays game seed seed + i, None for random courses
+        :param max_frames: frame limit per episode
+        :param max_batch: the most requests stepped in one tick
+        :param interval: seconds per tick, 0 to tick as soon as requests come in
+        """
+        self.seed = seed
+        self.max_frames = max_frames
+        self.max_batch = max_batch
+        self.interval = interval
+        self.pending = []  # (env, command, argument, future) waiting for the next tick
+        self.ready = asyncio.Event()
+        self.sessions = 0
+        self.connected = 0
+        self.ticks = 0
+        self.steps = 0
+
+    async def handle(self, reader, writer):
+        """
+        Serves one agent until it closes the connection.
+        """
+        env = DinoEnv(None if self.seed is None else self.seed + self.sessions, self.max_frames)
+        self.sessions += 1
+        self.connected += 1
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                command, argument = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+                if command == CLOSE:
+                    break
+                future = loop.create_future()
+                self.pending.append((env, command, argument, future))
+                self.ready.set()
+                writer.write(await future)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connected -= 1
+            writer.close()
+
+    def tick(self):
+        """
+        Steps a batch of pending requests and answers them.
+        """
+        batch = self.pending[:self.max_batch]
+        del self.pending[:self.max_batch]
+        for env, command, argument, future in batch:
+            if command == STEP:
+                obs, reward, done, info = env.step(argument)
+            else:
+                obs = env.reset(None if argument == NO_SEED else argument)
+                reward, done, info = 0, False, env.info
+            if not future.cancelled():
+                future.set_result(REPLY.pack(info['frames'], info['score'], done, reward, *obs))
+        self.ticks += 1
+        self.steps += len(batch)
+
+    async def run(self):
+        """
+        The tick loop.
+        """
+        next_tick = time.perf_counter()
+        while True:
+            await self.ready.wait()
+            if self.interval > 0:
+                # no catching up on ticks missed while idle
+                now = time.perf_counter()
+                next_tick = max(next_tick + self.interval, now)
+                await asyncio.sleep(next_tick - now)
+            else:
+                # give the other sessions a chance to get their requests into this tick
+                await asyncio.sleep(0)
+            self.tick()
+            if not self.pending:
+                self.ready.clear()
+
+    async def report(self, seconds):
+        """
+        Prints the tick rate and batch size every few seconds.
+        """
+        ticks, steps = self.ticks, self.steps
+        while True:
+            await asyncio.sleep(seconds)
+            n_ticks, n_steps = self.ticks - ticks, self.steps - steps
+            print('sessions: %d, ticks/s: %.0f, steps/s: %.0f, mean batch: %.1f' %
+                  (self.connected, n_ticks / seconds, n_steps / seconds, n_steps / n_ticks if n_ticks else 0))
+            ticks, steps = self.ticks, self.steps
+
+    async def serve(self, path=None, host='127.0.0.1', port=8765, report=0):
+        """
+        Listens on a Unix socket (if path is given) or TCP, and runs until cancelled.
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        tasks = [asyncio.create_task(self.run())]
+        if report > 0:
+            tasks.append(asyncio.create_task(self.report(report)))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class DinoClient:
+    """
+    Blocking client for agents, with the same reset/step calls as DinoEnv.
+    """
+
+    def __init__(self, path=None, host='127.0.0.1', port=8765):
+        """
+        :param path: Unix socket path of the server, or None for TCP
+        :param host: TCP host
+        :param port: TCP port
+        """
+        if path is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(path)
+        else:
+            self.sock = socket.create_connection((host, port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reply = bytearray(REPLY.size)
+        self.obs = np.zeros(OBS_SIZE, dtype=np.float32)
+        self.info = {'score': 0, 'frames': 0}
+
+    def request(self, command, argument):
+        """
+        Sends one request and waits for its reply.
+
+        :return: (reward, done)
+        """
+        self.sock.sendall(REQUEST.pack(command, argument))
+        view = memoryview(self.reply)
+        got = 0
+        while got < REPLY.size:
+            n = self.sock.recv_into(view[got:])
+            if n == 0:
+                raise ConnectionError('server closed the connection')
+            got += n
+        values = REPLY.unpack(self.reply)
+        self.info['frames'], self.info['score'] = values[0], values[1]
+        self.obs[:] = values[4:]
+        return values[3], bool(values[2])
+
+    def reset(self, seed=None):
+        """
+        :param seed: optional new game seed
+        :return: the first observation
+        """
+        self.request(RESET, NO_SEED if seed is None else seed)
+        return self.obs
+
+    def step(self, action):
+        """
+        :param action: true (or 1) to jump
+        :return: (observation, reward, done, info), the observation array and info dict are reused every step
+        """
+        reward, done = self.request(STEP, int(bool(action)))
+        return self.obs, reward, done, self.info
+
+    def close(self):
+        try:
+            self.sock.sendall(REQUEST.pack(CLOSE, 0))
+        finally:
+            self.sock.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Host headless dino games for external agents.')
+    parser.add_argument('--unix', help='Unix socket path to listen on (TCP on localhost otherwise)')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port')
+    parser.add_argument('--seed', type=int, default=None, help='game seed of the first session')
+    parser.add_argument('--max-frames', type=int, default=None, help='frame limit per episode')
+    parser.add_argument('--max-batch', type=int, default=1024, help='the most steps per tick')
+    parser.add_argument('--interval', type=float, default=0.0, help='seconds per tick, 0 to run as fast as possible')
+    parser.add_argument('--report', type=float, default=5.0, help='seconds between stats lines, 0 for none')
+    args = parser.parse_args()
+
+    server = DinoServer(args.seed, args.max_frames, args.max_batch, args.interval)
+    try:
+        asyncio.run(server.serve(args.unix, port=args.port, report=args.report))
+    except KeyboardInterrupt:
+        pass
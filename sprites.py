@@ -0,0 +1,48 @@
+"""
+ - sprites:
+ Where every sprite is in the sprite sheet, kept apart from graphics so the game sizes can be worked out
+ without importing pygame or loading any images.
+"""
+
+# crop rects of every sprite in the sprite sheet, None is the ground strip along the bottom of the sheet
+SPRITES = {
+    'ground': None,
+    'game_over': (954, 29, 380, 20),
+    'cloud': (954, 29, 380, 20),
+    'dino_still': (1338, 2, 87, 93),
+    'dino_step1': (1514, 2, 87, 93),
+    'dino_step2': (1602, 2, 87, 93),
+    'cactus1': (652, 2, 49, 99),
+    'cactus2': (801, 2, 150, 99),
+    'cactus3': (702, 2, 99, 99),
+    'cactus4': (446, 2, 33, 71),
+    'cactus5': (480, 2, 67, 71),
+    'cactus6': (548, 2, 101, 71),
+    'ptero_up': (260, 2, 91, 79),
+    'ptero_down': (352, 2, 91, 79)
+}
+
+# the sprite that gives each game object its size
+SIZE_SPRITES = {
+    'dino': 'dino_still',
+    'cactus1': 'cactus1',
+    'cactus2': 'cactus2',
+    'cactus3': 'cactus3',
+    'cactus4': 'cactus4',
+    'cactus5': 'cactus5',
+    'cactus6': 'cactus6',
+    'ptero': 'ptero_up'
+}
+
+
+def spriteSizes(scale_factor):
+    """
+    Returns the same size map as GFX.getSizes(), worked out from the crop table without loading any images
+
+    :param scale_factor: the scale factor of the display
+    """
+    size_map = {}
+    for name, sprite in SIZE_SPRITES.items():
+        x, y, w, h = SPRITES[sprite]
+        size_map[name] = (int(w * scale_factor), int(h * scale_factor))
+    return size_map
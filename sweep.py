@@ -0,0 +1,334 @@
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import time
+
+import numpy as np
+
+from perceptron import N_INPUTS, Perceptron
+from headless import makeGame
+from trainer import playEpisode
+from fastforward import FastForward
+from telemetry import LEVELS, TELEMETRY
+
+"""
+ - sweep:
+ Runs hyperparameter, feature-set and game-constant sweeps headless, over a pool of worker processes.
+    - A spec lists values for each parameter: a grid sweep runs every combination,
+      a random sweep draws a number of configs (from the lists, or from {"low", "high", "log"} ranges)
+    - Parameters: lr, features (indices of the build_input_vector inputs the perceptron sees),
+      max_copies and the game constants in GAME_PARAMS
+    - Every config trains a perceptron for a number of episodes on seeded courses, then plays
+      a number of seeded evaluation episodes with the weights frozen. All configs play the same courses
+    - Results are cached on disk, one JSON file per config, keyed by a hash of the config and of the
+      simulation source files, so running a sweep again only runs the configs that are new or whose code changed
+    - Prints the configs ranked by mean evaluation score
+"""
+
+GAME_PARAMS = ('init_velocity', 'dino_jump_velocity', 'gravity', 'dino_accel_rate', 'speed_increase_tick',
+               'spawn_const')
+PARAMS = ('lr', 'features', 'max_copies') + GAME_PARAMS
+# the parameters the game uses as counts, drawn values are rounded to integers
+INT_PARAMS = ('max_copies', 'speed_increase_tick', 'spawn_const')
+SETTINGS = {'episodes': 200, 'eval_episodes': 10, 'max_frames': 20000, 'seed': 0}
+# the files whose code decides a result
+CODE_FILES = ('controller.py', 'physics.py', 'sprites.py', 'game.py', 'perceptron.py', 'headless.py',
+              'trainer.py', 'fastforward.py', 'sweep.py')
+
+
+class MaskedPerceptron(Perceptron):
+    """
+    A Perceptron that only sees some of its inputs, the others read as 0 (so their weights stay 0).
+    """
+
+    def __init__(self, scheme: list, features=None):
+        """
+        :param scheme: list of (name, input) tuples
+        :param features: indices of the inputs to use, None for all of them
+        """
+        self.mask = np.zeros(N_INPUTS, dtype=np.float32)
+        self.mask[list(range(N_INPUTS)) if features is None else list(features)] = 1
+        super().__init__(scheme)
+
+    def run_network(self, x_vector):
+        # the input vector is new every tick, and the same array is kept as the trigger point
+        x_vector *= self.mask
+        return super().run_network(x_vector)
+
+
+def codeVersion():
+    """
+    :return: hash of the simulation source files
+    """
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_FILES:
+        with open(os.path.join(here, name), 'rb') as f:
+            digest.update(name.encode() + b'\0' + f.read())
+    return digest.hexdigest()
+
+
+def configKey(config, version):
+    """
+    :param config: a config dict (params and settings)
+    :param version: the code version
+    :return: the cache key of the config
+    """
+    text = json.dumps(config, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256((version + text).encode()).hexdigest()[:24]
+
+
+def expand(spec):
+    """
+    Turns a sweep spec into its list of configs.
+
+    :param spec: dict with params (name -> list of values, or a {"low", "high", "log", "int"} range),
+                 mode ("grid" or "random"), samples (for random), and optionally the SETTINGS keys.
+                 Ranges of the INT_PARAMS are always drawn as integers
+    :return: list of config dicts {"params": ..., plus the settings}
+    :raises ValueError: for an unknown parameter, a range in a grid sweep,
+                        or a value that isn't an integer in the list of one of the INT_PARAMS
+    """
+    params = spec.get('params', {})
+    for name in params:
+        if name not in PARAMS:
+            raise ValueError('unknown parameter %r, expected one of %s' % (name, ', '.join(PARAMS)))
+        if name in INT_PARAMS and isinstance(params[name], list):
+            for value in params[name]:
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+                    raise ValueError('parameter %r needs integer values, got %r' % (name, value))
+            params[name] = [int(value) for value in params[name]]
+    settings = {key: spec.get(key, default) for key, default in SETTINGS.items()}
+    names = sorted(params)
+
+    if spec.get('mode', 'grid') == 'grid':
+        for name in names:
+            if not isinstance(params[name], list):
+                raise ValueError('grid parameter %r needs a list of values' % name)
+        combos = itertools.product(*(params[name] for name in names))
+        return [dict(settings, params=dict(zip(names, combo))) for combo in combos]
+
+    rng = random.Random(spec.get('sample_seed', 0))
+    configs = []
+    for _ in range(spec.get('samples', 20)):
+        values = {}
+        for name in names:
+            choice = params[name]
+            if isinstance(choice, list):
+                values[name] = rng.choice(choice)
+            elif choice.get('log'):
+                values[name] = math.exp(rng.uniform(math.log(choice['low']), math.log(choice['high'])))
+            else:
+                values[name] = rng.uniform(choice['low'], choice['high'])
+            if isinstance(choice, dict) and (choice.get('int') or name in INT_PARAMS):
+                values[name] = int(round(values[name]))
+        configs.append(dict(settings, params=values))
+    return configs
+
+
+def runConfig(config):
+    """
+    Trains and evaluates a perceptron for one config.
+
+    :param config: a config dict from expand()
+    :return: dict of results: eval_mean, eval_std, train_mean, best, frames, seconds and the final weights
+    """
+    start = time.perf_counter()
+    params = config['params']
+    percep = MaskedPerceptron([('play', -1), ('jump', 0)], params.get('features'))
+    if 'lr' in params:
+        percep.lr = params['lr']
+    game = makeGame(percep, seed=config['seed'], max_copies=params.get('max_copies', 1))
+    for name in GAME_PARAMS:
+        if name in params:
+            setattr(game, name, params[name])
+    game.dino.gravity = game.gravity
+    state = game.getGameState()
+
+    frames = 0
+    train = []
+    for _ in range(config['episodes']):
+        train.append(playEpisode(game, percep, config['max_frames']))
+        frames += game.frames
+
+    # the evaluation courses come from their own seed, the same for every config
+    state['freeze'] = True
+    game.reseed(config['seed'] + 1)
+    fast = FastForward(game, percep)
+    scores = [fast.play(config['max_frames']) for _ in range(config['eval_episodes'])]
+    frames += fast.stepped + fast.skipped
+
+    return {
+        'eval_mean': float(np.mean(scores)) if scores else 0.0,
+        'eval_std': float(np.std(scores)) if scores else 0.0,
+        'train_mean': float(np.mean(train)) if train else 0.0,
+        'best': int(max(train + scores, default=0)),
+        'frames': int(frames),
+        'seconds': time.perf_counter() - start,
+        'w': percep.w.tolist()
+    }
+
+
+def _runCell(item):
+    # pool task: (key, config) -> (key, results)
+    key, config = item
+    return key, runConfig(config)
+
+
+class SweepCache:
+    """
+    Results on disk, one JSON file per config key.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """
+        :return: the cached record, or None
+        """
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, record):
+        """
+        Writes a record atomically.
+        """
+        tmp = self.path(key) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp, self.path(key))
+
+
+def sweep(spec, cache_dir='data/sweep-cache', workers=None, progress=True):
+    """
+    Runs every config of a spec that isn't cached yet.
+
+    :param spec: the sweep spec, see expand()
+    :param cache_dir: the cache directory
+    :param workers: number of worker processes, 0 to run in this process
+    :param progress: print a line per finished config
+    :return: list of records (config, results, key, cached), ranked by mean evaluation score
+    """
+    version = codeVersion()
+    cache = SweepCache(cache_dir)
+    records = {}
+    todo = []
+    for config in expand(spec):
+        key = configKey(config, version)
+        if key in records:
+            continue
+        record = cache.get(key)
+        if record is not None:
+            record['cached'] = True
+            records[key] = record
+        else:
+            records[key] = None
+            todo.append((key, config))
+
+    configs = dict(todo)
+    if progress:
+        print('%d configs, %d cached, %d to run' % (len(records), len(records) - len(todo), len(todo)))
+    workers = os.cpu_count() if workers is None else workers
+    if workers > 0 and len(todo) > 1:
+        with mp.Pool(min(workers, len(todo))) as pool:
+            results = pool.imap_unordered(_runCell, todo)
+            records.update(_collect(results, configs, cache, progress, len(todo)))
+    else:
+        records.update(_collect(map(_runCell, todo), configs, cache, progress, len(todo)))
+    return sorted(records.values(), key=lambda record: -record['results']['eval_mean'])
+
+
+def _collect(results, configs, cache, progress, total):
+    # caches the results as they come in
+    for done, (key, results) in enumerate(results, 1):
+        record = {'key': key, 'config': configs[key], 'results': results}
+        cache.put(key, record)
+        record['cached'] = False
+        if progress:
+            print('[%d/%d] %s: eval %.1f (%.1fs)' % (done, total, formatParams(configs[key]['params']),
+                                                     results['eval_mean'], results['seconds']))
+        yield key, record
+
+
+def formatParams(params):
+    return ' '.join('%s=%s' % (name, formatValue(params[name])) for name in sorted(params))
+
+
+def formatValue(value):
+    if isinstance(value, float):
+        return '%.4g' % value
+    if isinstance(value, list):
+        return ''.join(str(v) for v in value)
+    return str(value)
+
+
+def summary(records, top=None):
+    """
+    :param records: ranked records from sweep()
+    :param top: only the best few rows
+    :return: the ranked summary table as text, cached rows are marked with *
+    """
+    names = sorted({name for record in records for name in record['config']['params']})
+    header = '%4s %9s %8s %9s %6s %9s  ' % ('rank', 'eval', 'std', 'train', 'best', 'seconds')
+    header += ' '.join('%12s' % name[:12] for name in names)
+    lines = [header]
+    for rank, record in enumerate(records[:top], 1):
+        r = record['results']
+        params = record['config']['params']
+        line = '%4d %9.1f %8.1f %9.1f %6d %8.1f%s  ' % (rank, r['eval_mean'], r['eval_std'], r['train_mean'],
+                                                       r['best'], r['seconds'], '*' if record['cached'] else ' ')
+        line += ' '.join('%12s' % formatValue(params.get(name, '-')) for name in names)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a cached, parallel sweep of perceptron and game settings.')
+    parser.add_argument('spec', nargs='?', help='JSON spec file, see sweep.expand')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=JSON',
+                        help='a parameter to sweep: a JSON list of values, or a {"low", "high", "log", "int"} range')
+    parser.add_argument('--random', type=int, metavar='N', help='draw N random configs instead of the full grid')
+    for key, default in SETTINGS.items():
+        parser.add_argument('--' + key.replace('_', '-'), type=int, help='default %d' % default)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--cache', default='data/sweep-cache', help='cache directory')
+    parser.add_argument('--top', type=int, default=None, help='only show the best N configs')
+    parser.add_argument('--log-level', choices=list(LEVELS), default='warning', help='the lowest message level printed')
+    args = parser.parse_args()
+    TELEMETRY.configure(args.log_level)
+
+    spec = {}
+    if args.spec:
+        with open(args.spec) as f:
+            spec = json.load(f)
+    spec.setdefault('params', {})
+    for param in args.param:
+        name, _, value = param.partition('=')
+        spec['params'][name] = json.loads(value)
+    if args.random is not None:
+        spec['mode'] = 'random'
+        spec['samples'] = args.random
+    for key in SETTINGS:
+        if getattr(args, key) is not None:
+            spec[key] = getattr(args, key)
+
+    start = time.perf_counter()
+    try:
+        records = sweep(spec, args.cache, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    print(summary(records, args.top))
+    print('%d configs in %.1fs' % (len(records), time.perf_counter() - start))
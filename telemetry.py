@@ -0,0 +1,184 @@
+import atexit
+import collections
+import json
+import sys
+import threading
+import time
+
+"""
+ - telemetry:
+ Messages and structured records from the game and the controllers, without stdout I/O in the hot paths.
+    - Messages have levels (DEBUG, INFO, WARNING), anything below the configured level costs one comparison
+      and is never formatted
+    - Messages are keyed: a key prints at most once per rate seconds, a message identical to the last one
+      of its key is held back for repeat seconds, and the next line of that key says how many were dropped
+    - record() queues a structured record (one per episode from the controllers: death, score, frames,
+      death cause, weights), and a background thread writes the queue to a JSONL file every flush_interval seconds
+      (or sooner when it fills up), so the training loop only pays for a deque append
+    - TELEMETRY is the process-wide instance, configured once by the scripts with configure()
+"""
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING}
+
+
+class Telemetry:
+    """
+    Leveled, rate-limited and deduplicated messages, plus a buffered JSONL sink for records.
+    """
+
+    def __init__(self, level=INFO, stream=None, rate=1.0, repeat=10.0):
+        """
+        :param level: the lowest level that is printed
+        :param stream: where messages go, sys.stderr by default
+        :param rate: the least seconds between two messages of the same key
+        :param repeat: seconds a message identical to the last one of its key is held back
+        """
+        self.level = level
+        self.stream = stream
+        self.rate = rate
+        self.repeat = repeat
+        self.keys = {}  # key -> [time of the last message, the last message, messages dropped since]
+
+        # record sink
+        self.path = None
+        self.file = None
+        self.recording = False
+        self.records = collections.deque()
+        self.max_buffer = 4096
+        self.flush_interval = 1.0
+        self.wake = threading.Event()
+        self.stop = False
+        self.thread = None
+        self.written = 0
+
+    def configure(self, level=None, path=None, rate=None, repeat=None, flush_interval=None, max_buffer=None):
+        """
+        Changes the settings, and starts writing records to a JSONL file if a path is given.
+
+        :param level: the lowest level that is printed, an int or a name from LEVELS
+        :param path: JSONL file the records are appended to
+        :param rate: the least seconds between two messages of the same key
+        :param repeat: seconds a message identical to the last one of its key is held back
+        :param flush_interval: the most seconds a record waits in the queue
+        :param max_buffer: queued records that wake the writer thread early
+        """
+        if level is not None:
+            self.level = LEVELS[level] if isinstance(level, str) else level
+        if rate is not None:
+            self.rate = rate
+        if repeat is not None:
+            self.repeat = repeat
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if max_buffer is not None:
+            self.max_buffer = max_buffer
+        if path is not None:
+            self.close()
+            self.path = path
+            self.file = open(path, 'a')
+            self.stop = False
+            self.recording = True
+            self.thread = threading.Thread(target=self.writer, name='telemetry', daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+
+    def log(self, level, key, message, *args):
+        """
+        Prints a message, unless its level is too low or its key is rate limited or repeating.
+
+        :param level: DEBUG, INFO or WARNING
+        :param key: the name messages are rate limited and deduplicated under
+        :param message: the message, %-formatted with args only when it is printed
+        """
+        if level < self.level:
+            return
+        now = time.monotonic()
+        last = self.keys.get(key)
+        if last is not None and now - last[0] < self.rate:
+            last[2] += 1
+            return
+        if args:
+            message = message % args
+        if last is None:
+            last = self.keys[key] = [now, None, 0]
+        elif message == last[1] and now - last[0] < self.repeat:
+            last[2] += 1
+            return
+        if last[2]:
+            message += ' (%d similar dropped)' % last[2]
+        last[0], last[1], last[2] = now, message, 0
+        print(message, file=self.stream or sys.stderr)
+
+    def debug(self, key, message, *args):
+        self.log(DEBUG, key, message, *args)
+
+    def info(self, key, message, *args):
+        self.log(INFO, key, message, *args)
+
+    def warning(self, key, message, *args):
+        self.log(WARNING, key, message, *args)
+
+    def record(self, kind, **fields):
+        """
+        Queues a structured record for the JSONL file, a no-op unless a path is configured.
+        The values must be JSON serializable (lists, not arrays) and are not copied.
+
+        :param kind: the record type, stored as "kind"
+        """
+        if not self.recording:
+            return
+        fields['kind'] = kind
+        fields['time'] = time.time()
+        self.records.append(fields)
+        if len(self.records) >= self.max_buffer:
+            self.wake.set()
+
+    def flush(self):
+        """
+        Writes every queued record to the file.
+        """
+        if self.file is None:
+            return
+        lines = []
+        records = self.records
+        while records:
+            lines.append(json.dumps(records.popleft()))
+        if lines:
+            self.file.write('\n'.join(lines) + '\n')
+            self.file.flush()
+            self.written += len(lines)
+
+    def writer(self):
+        """
+        The writer thread: flushes the queue every flush_interval seconds, or when woken up.
+        """
+        while not self.stop:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def close(self):
+        """
+        Stops the writer thread, writes what is left in the queue and closes the file.
+        Messages still held back are reported.
+        """
+        for key, (_, message, dropped) in self.keys.items():
+            if dropped:
+                print('%s: %d more messages dropped' % (key, dropped), file=self.stream or sys.stderr)
+                self.keys[key][2] = 0
+        if self.thread is not None:
+            self.stop = True
+            self.wake.set()
+            self.thread.join()
+            self.thread = None
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+        self.recording = False
+
+
+TELEMETRY = Telemetry()
@@ -0,0 +1,161 @@
+import argparse
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from perceptron import Perceptron
+from headless import makeGame
+from fastforward import FastForward
+
+"""
+ - trainer:
+ Trains perceptron weights with an evolution strategy, spread over a pool of worker processes.
+    - Each worker builds one headless game and perceptron when it starts, and reuses them for every task
+    - A task is (weights, seed, episodes, max_frames), and only its mean score comes back,
+      so nothing but small arrays ever crosses a process boundary
+    - Learning is frozen inside the workers, the weights only change in the main process
+    - With fast-forward on, workers play with FastForward and skip the uneventful frames, for the same scores
+"""
+
+_game = None
+_percep = None
+_fast = None
+
+
+def _initWorker(fast=False):
+    """
+    Builds the game for this worker process.
+
+    :param fast: play the episodes with FastForward
+    """
+    global _game, _percep, _fast
+    percep_ctrl = [('play', -1),
+                   ('jump', 0)]
+    _percep = Perceptron(percep_ctrl)
+    _game = makeGame(_percep)
+    _game.getGameState()['freeze'] = True
+    _fast = FastForward(_game, _percep) if fast else None
+
+
+def playEpisode(game, controls, max_frames):
+    """
+    Plays one game from the start until the dino dies.
+
+    :param game: a headless game driven by controls
+    :param controls: the controller to tick each frame
+    :param max_frames: frame limit for a dino that never dies
+    :return: the score of the episode
+    """
+    game_state = game.getGameState()
+    # the first tick restarts the game
+    game_state['playing'] = False
+    controls.tick(game_state)
+    game.tick()
+    for _ in range(max_frames):
+        controls.tick(game_state)
+        game.tick()
+        if not game_state['playing']:
+            break
+    return game_state['score']
+
+
+def evaluate(task):
+    """
+    Worker task: scores one weight vector.
+
+    :param task: tuple of (weights, seed, episodes, max_frames)
+    :return: the mean score over the episodes
+    """
+    weights, seed, episodes, max_frames = task
+    _percep.w = weights.copy()
+    _game.reseed(seed)
+    total = 0
+    for _ in range(episodes):
+        if _fast is not None:
+            total += _fast.play(max_frames)
+        else:
+            total += playEpisode(_game, _percep, max_frames)
+    return total / episodes
+
+
+class EvolutionTrainer:
+    """
+    Evolution strategy with mirrored sampling and rank-based fitness shaping.
+    """
+
+    def __init__(self, pool, workers, population=64, sigma=0.05, lr=0.02, episodes=3, max_frames=20000, seed=None):
+        """
+        :param pool: a multiprocessing pool made with _initWorker as its initializer
+        :param workers: number of processes in the pool
+        :param population: number of weight vectors per generation (rounded up to an even number)
+        :param sigma: standard deviation of the weight noise
+        :param lr: step size of the weight update
+        :param episodes: episodes played per weight vector
+        :param max_frames: frame limit per episode
+        :param seed: seed for the noise and for the obstacle courses
+        """
+        self.pool = pool
+        self.workers = workers
+        self.half = (population + 1) // 2
+        self.sigma = sigma
+        self.lr = lr
+        self.episodes = episodes
+        self.max_frames = max_frames
+        self.rng = np.random.default_rng(seed)
+        self.w = np.zeros(6)
+        self.generation = 0
+        self.best_score = 0.0
+        self.best_w = self.w.copy()
+
+    def step(self):
+        """
+        Runs one generation and moves the weights.
+
+        :return: the mean score of the generation
+        """
+        noise = self.rng.standard_normal((self.half, len(self.w)))
+        noise = np.concatenate([noise, -noise])
+        population = self.w + self.sigma * noise
+
+        # every member of a generation plays the same courses
+        course = int(self.rng.integers(2 ** 31))
+        tasks = [(w, course, self.episodes, self.max_frames) for w in population]
+        chunksize = max(1, len(tasks) // (4 * self.workers))
+        scores = np.array(self.pool.map(evaluate, tasks, chunksize=chunksize))
+
+        best = int(scores.argmax())
+        if scores[best] > self.best_score:
+            self.best_score = scores[best]
+            self.best_w = population[best].copy()
+
+        # centered ranks, so the update doesn't depend on the scale of the scores
+        ranks = np.empty(len(scores))
+        ranks[scores.argsort()] = np.arange(len(scores))
+        utility = ranks / (len(scores) - 1) - 0.5
+        self.w += self.lr / (len(scores) * self.sigma) * noise.T @ utility
+        self.generation += 1
+        return scores.mean()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train perceptron weights on every core.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--population', type=int, default=64, help='weight vectors per generation')
+    parser.add_argument('--generations', type=int, default=50, help='number of generations')
+    parser.add_argument('--episodes', type=int, default=3, help='episodes per weight vector')
+    parser.add_argument('--sigma', type=float, default=0.05, help='weight noise')
+    parser.add_argument('--lr', type=float, default=0.02, help='step size')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the noise and the courses')
+    parser.add_argument('--fast', action='store_true', help='skip uneventful frames with FastForward')
+    args = parser.parse_args()
+
+    with mp.Pool(args.workers, initializer=_initWorker, initargs=(args.fast,)) as pool:
+        trainer = EvolutionTrainer(pool, args.workers, args.population, args.sigma, args.lr, args.episodes, seed=args.seed)
+        for _ in range(args.generations):
+            start = time.perf_counter()
+            mean = trainer.step()
+            print('generation %d: mean score %.1f, best %.1f, %.2fs' %
+                  (trainer.generation, mean, trainer.best_score, time.perf_counter() - start))
+        print('best weights:', trainer.best_w.tolist())